@@ -0,0 +1,28 @@
+import time
+
+from django.core.cache import caches
+
+cache = caches["versions"]
+
+
+def version_key(name, *parts):
+    return ":".join(("version", name, *map(str, parts)))
+
+
+def get_version(name, *parts):
+    key = version_key(name, *parts)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(name, *parts):
+    key = version_key(name, *parts)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = time.time_ns()
+        cache.set(key, version, timeout=None)
+        return version
@@ -0,0 +1,154 @@
+import base64
+import binascii
+import hashlib
+import re
+import tempfile
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.files import File
+from django.core.files.storage import default_storage
+from drf_extra_fields.fields import Base64ImageField
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+from rest_framework.fields import ReadOnlyField
+from rest_framework.relations import (MANY_RELATION_KWARGS, ManyRelatedField,
+                                      PrimaryKeyRelatedField)
+
+from recipes.images import rendition_candidates, rendition_url
+from recipes.models import ImageRendition
+
+DECODE_CHUNK_SIZE = 64 * 1024
+NON_BASE64_CHARACTERS = re.compile(r"[^A-Za-z0-9+/=]")
+
+
+def get_rendition_width(file):
+    instance = getattr(file, "instance", None)
+    if hasattr(instance, "rendition_width"):
+        return instance.rendition_width
+    width = ImageRendition.objects.filter(
+        image=file.name, status=ImageRendition.DONE
+    ).values_list("width", flat=True).first()
+    if instance is not None:
+        instance.rendition_width = width
+    return width
+
+
+class StreamingBase64ImageField(Base64ImageField):
+    def __init__(self, *args, upload_to="", rendition=None, **kwargs):
+        self.upload_to = upload_to
+        self.rendition = rendition
+        super().__init__(*args, **kwargs)
+
+    def decode(self, payload):
+        upload = File(tempfile.TemporaryFile())
+        digest = hashlib.sha256()
+        remainder = ""
+        try:
+            for start in range(0, len(payload), DECODE_CHUNK_SIZE):
+                encoded = remainder + NON_BASE64_CHARACTERS.sub(
+                    "", payload[start:start + DECODE_CHUNK_SIZE])
+                size = len(encoded) - len(encoded) % 4
+                remainder = encoded[size:]
+                chunk = base64.b64decode(encoded[:size])
+                digest.update(chunk)
+                upload.write(chunk)
+            if remainder:
+                base64.b64decode(remainder)
+        except (binascii.Error, ValueError):
+            upload.close()
+            raise ValidationError(self.INVALID_FILE_MESSAGE)
+        upload.seek(0)
+        return upload, digest.hexdigest()
+
+    def get_extension(self, upload):
+        try:
+            with Image.open(upload) as image:
+                extension = image.format.lower()
+                image.verify()
+        except Exception:
+            upload.close()
+            raise ValidationError(self.INVALID_FILE_MESSAGE)
+        upload.seek(0)
+        return "jpg" if extension == "jpeg" else extension
+
+    def to_internal_value(self, base64_data):
+        if base64_data in self.EMPTY_VALUES:
+            return None
+        if not isinstance(base64_data, str):
+            raise ValidationError(self.INVALID_FILE_MESSAGE)
+        upload, digest = self.decode(base64_data.rpartition(";base64,")[2])
+        extension = self.get_extension(upload)
+        if extension not in self.ALLOWED_TYPES:
+            upload.close()
+            raise ValidationError(self.INVALID_TYPE_MESSAGE)
+        upload.name = f"{digest}.{extension}"
+        existing_name = f"{self.upload_to}{upload.name}"
+        if default_storage.exists(existing_name):
+            upload.close()
+            return existing_name
+        return upload
+
+    def to_representation(self, file):
+        rendition = self.context.get("image_rendition", self.rendition)
+        if not file or rendition is None or not get_rendition_width(file):
+            return super().to_representation(file)
+        url = rendition_url(file.name, rendition)
+        request = self.context.get("request")
+        return request.build_absolute_uri(url) if request else url
+
+
+class ImageSrcsetField(ReadOnlyField):
+    def __init__(self, extension="jpg", **kwargs):
+        self.extension = extension
+        kwargs.setdefault("source", "image")
+        super().__init__(**kwargs)
+
+    def to_representation(self, file):
+        width = get_rendition_width(file) if file else None
+        if not width:
+            return None
+        request = self.context.get("request")
+        return ", ".join(
+            f"{request.build_absolute_uri(url) if request else url} {width}w"
+            for url, width in rendition_candidates(
+                file.name, width, self.extension)
+        )
+
+
+class BulkPrimaryKeyRelatedField(PrimaryKeyRelatedField):
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {"child_relation": cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BulkManyRelatedField(**list_kwargs)
+
+    def to_internal_value(self, data):
+        if self.pk_field is not None:
+            data = self.pk_field.to_internal_value(data)
+        try:
+            if isinstance(data, bool):
+                raise TypeError
+            return self.get_queryset().model._meta.pk.to_python(data)
+        except (TypeError, ValueError, DjangoValidationError):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+
+    def resolve(self, pks):
+        objects = self.get_queryset().in_bulk(set(pks))
+        errors = [
+            None if pk in objects
+            else self.error_messages["does_not_exist"].format(pk_value=pk)
+            for pk in pks
+        ]
+        return objects, errors
+
+
+class BulkManyRelatedField(ManyRelatedField):
+    def to_internal_value(self, data):
+        pks = super().to_internal_value(data)
+        objects, errors = self.child_relation.resolve(pks)
+        missing = [error for error in errors if error]
+        if missing:
+            raise ValidationError(missing)
+        return [objects[pk] for pk in pks]
@@ -1,6 +1,13 @@
+from django.db.models import Exists, OuterRef
 from django_filters.rest_framework import FilterSet, filters
 
-from recipes.models import Ingredient, Recipe, Tag
+from api.tag_index import tag_index
+from recipes.models import Ingredient, Recipe
+from recipes.search import search as search_recipes
+
+
+def get_tag_choices():
+    return [(slug, slug) for slug in tag_index.get_ids()]
 
 
 class IngredientFilter(FilterSet):
@@ -12,33 +19,76 @@ class IngredientFilter(FilterSet):
 
 
 class RecipeFilter(FilterSet):
-    tags = filters.ModelMultipleChoiceFilter(
-        field_name="tags__slug",
-        to_field_name="slug",
-        queryset=Tag.objects.all(),
+    TAGS_ANY = "any"
+    TAGS_ALL = "all"
+
+    tags = filters.MultipleChoiceFilter(
+        choices=get_tag_choices,
+        method="filter_tags",
+    )
+    tags_mode = filters.ChoiceFilter(
+        choices=(
+            (TAGS_ANY, "Любой из тегов"),
+            (TAGS_ALL, "Все теги"),
+        ),
+        method="filter_tags_mode",
     )
     is_favorited = filters.BooleanFilter(method="filter_is_favorited")
     is_in_shopping_cart = filters.BooleanFilter(
         method="filter_is_in_shopping_cart"
     )
+    search = filters.CharFilter(method="filter_search")
+    ordering = filters.ChoiceFilter(
+        choices=(("popular", "По популярности"),),
+        method="filter_ordering",
+    )
+
+    ORDERINGS = {
+        "popular": ("-favorites_count", "-pub_date", "-id"),
+    }
 
     class Meta:
         model = Recipe
         fields = (
             "tags",
+            "tags_mode",
             "author",
             "is_favorited",
             "is_in_shopping_cart",
+            "search",
+            "ordering",
         )
 
+    def filter_tags(self, queryset, name, value):
+        if not value:
+            return queryset
+        ids = tag_index.get_ids()
+        tag_ids = [ids[slug] for slug in value if slug in ids]
+        recipe_tags = Recipe.tags.through.objects.filter(
+            recipe_id=OuterRef("pk"))
+        if self.form.cleaned_data.get("tags_mode") != self.TAGS_ALL:
+            return queryset.filter(
+                Exists(recipe_tags.filter(tag_id__in=tag_ids)))
+        for tag_id in dict.fromkeys(tag_ids):
+            queryset = queryset.filter(
+                Exists(recipe_tags.filter(tag_id=tag_id)))
+        return queryset
+
+    def filter_tags_mode(self, queryset, name, value):
+        return queryset
+
     def filter_is_favorited(self, queryset, name, value):
         if value and self.request.user.is_authenticated:
-            return queryset.filter(
-                recipes_favorite_related__user=self.request.user)
+            return queryset.filter(is_favorited=True)
         return queryset
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
         if value and self.request.user.is_authenticated:
-            return queryset.filter(
-                recipes_shoppingcart_related__user=self.request.user)
+            return queryset.filter(is_in_shopping_cart=True)
         return queryset
+
+    def filter_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
+
+    def filter_ordering(self, queryset, name, value):
+        return queryset.order_by(*self.ORDERINGS[value])
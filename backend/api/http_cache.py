@@ -0,0 +1,63 @@
+from functools import partial
+
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers, quote_etag)
+from django.utils.http import http_date
+
+from api.cache import cache, get_version, version_key
+
+
+def get_versions(*keys):
+    versions = cache.get_many([version_key(*key) for key in keys])
+    return [
+        versions.get(version_key(*key)) or get_version(*key) for key in keys
+    ]
+
+
+def get_viewer_versions(user):
+    if not user.is_authenticated:
+        return ["anonymous"]
+    return [user.id, *get_versions(
+        ("favorites", user.id),
+        ("cart", user.id),
+        ("subscriptions", user.id),
+    )]
+
+
+class ConditionalGetMixin:
+    def get_etag(self, request):
+        return None
+
+    def get_last_modified(self, request):
+        return None
+
+    def get_cache_control(self, request):
+        return {"private": True, "no_cache": True}
+
+    def conditional_response(self, request, render):
+        etag = self.get_etag(request)
+        if etag is None:
+            return render()
+        etag = quote_etag(etag)
+        last_modified = self.get_last_modified(request)
+        if last_modified is not None:
+            last_modified = int(last_modified.timestamp())
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = render()
+        if response.status_code in (200, 304):
+            response["ETag"] = etag
+            if last_modified is not None:
+                response["Last-Modified"] = http_date(last_modified)
+            patch_cache_control(response, **self.get_cache_control(request))
+            patch_vary_headers(response, ("Authorization",))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request, partial(super().list, request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request, partial(super().retrieve, request, *args, **kwargs))
@@ -0,0 +1,70 @@
+import time
+from bisect import bisect_left
+from itertools import islice
+from threading import Lock
+
+from django.conf import settings
+
+from api.cache import get_version
+from recipes.models import Ingredient
+
+MAX_CHAR = chr(0x10FFFF)
+
+
+class IngredientIndex:
+    def __init__(self):
+        self.lock = Lock()
+        self.version = None
+        self.built_at = None
+        self.keys = []
+        self.entries = []
+
+    def invalidate(self):
+        self.version = None
+
+    def build(self, version):
+        entries = sorted(
+            (name.casefold(), name, id, measurement_unit)
+            for id, name, measurement_unit in Ingredient.objects.values_list(
+                "id", "name", "measurement_unit").iterator()
+        )
+        self.keys = [entry[0] for entry in entries]
+        self.entries = [
+            {"id": id, "name": name, "measurement_unit": measurement_unit}
+            for _, name, id, measurement_unit in entries
+        ]
+        self.version = version
+        self.built_at = time.monotonic()
+
+    def is_stale(self, version):
+        return self.version != version or (
+            time.monotonic() - self.built_at > settings.INDEX_MAX_AGE)
+
+    def ensure_built(self):
+        version = get_version("ingredients")
+        if self.is_stale(version):
+            with self.lock:
+                if self.is_stale(version):
+                    self.build(version)
+        return self.keys, self.entries
+
+    def search(self, query, limit=None):
+        keys, entries = self.ensure_built()
+        query = query.casefold()
+        start = bisect_left(keys, query)
+        end = bisect_left(keys, query + MAX_CHAR, start)
+        results = entries[start:end][:limit]
+        if limit is not None and len(results) >= limit:
+            return results
+        substring_matches = (
+            entries[position] for position, key in enumerate(keys)
+            if query in key and not key.startswith(query)
+        )
+        results.extend(islice(
+            substring_matches,
+            None if limit is None else limit - len(results),
+        ))
+        return results
+
+
+ingredient_index = IngredientIndex()
@@ -1,5 +1,156 @@
-from rest_framework.pagination import PageNumberPagination
+from functools import partial
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db import connection
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+from api.cache import get_version
+from api.http_cache import get_viewer_versions
+
+
+def get_estimated_count(model):
+    if connection.vendor != "postgresql":
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+            [model._meta.db_table],
+        )
+        row = cursor.fetchone()
+    if row is None or row[0] < settings.ESTIMATED_COUNT_THRESHOLD:
+        return None
+    return row[0]
+
+
+class EstimatedCountPage(Page):
+    def __init__(self, object_list, number, paginator, has_next):
+        super().__init__(object_list, number, paginator)
+        self.has_more = has_next
+
+    def has_next(self):
+        return self.has_more
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def previous_page_number(self):
+        return self.number - 1
+
+
+class CachedCountPaginator(Paginator):
+    def __init__(self, object_list, per_page, cache_key=None,
+                 estimate=False, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.cache_key = cache_key
+        self.estimate = estimate
+        self.count_exact = True
+
+    @cached_property
+    def count(self):
+        if self.estimate:
+            count = get_estimated_count(self.object_list.model)
+            if count is not None:
+                self.count_exact = False
+                return count
+        count = cache.get(self.cache_key)
+        if count is None:
+            count = self.object_list.count()
+            cache.set(self.cache_key, count, settings.COUNT_CACHE_TIMEOUT)
+        return count
+
+    def validate_number(self, number):
+        if self.count_exact:
+            return super().validate_number(number)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(_("That page number is not an integer"))
+        if number < 1:
+            raise EmptyPage(_("That page number is less than 1"))
+        return number
+
+    def page(self, number):
+        if not self.count or self.count_exact:
+            return super().page(number)
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        object_list = list(
+            self.object_list[bottom:bottom + self.per_page + 1])
+        if not object_list and number > 1:
+            raise EmptyPage(_("That page contains no results"))
+        return EstimatedCountPage(
+            object_list[:self.per_page], number, self,
+            has_next=len(object_list) > self.per_page,
+        )
 
 
 class CustomPagination(PageNumberPagination):
     page_size_query_param = "limit"
+
+
+class CachedCountPagination(CustomPagination):
+    ignored_query_params = ("page", "limit", "format")
+
+    def get_filter_params(self, request):
+        return sorted(
+            (key, value)
+            for key, values in request.query_params.lists()
+            for value in values
+            if key not in self.ignored_query_params
+        )
+
+    def get_count_cache_key(self, queryset, request, filter_params):
+        signature = repr((
+            queryset.model._meta.label,
+            filter_params,
+            get_version("catalog"),
+            *get_viewer_versions(request.user),
+        ))
+        return f"count:{md5(signature.encode()).hexdigest()}"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        filter_params = self.get_filter_params(request)
+        self.django_paginator_class = partial(
+            CachedCountPaginator,
+            cache_key=self.get_count_cache_key(
+                queryset, request, filter_params),
+            estimate=not filter_params,
+        )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        response.data["count_exact"] = self.page.paginator.count_exact
+        return response
+
+
+class RecipeCursorPagination(CursorPagination):
+    page_size_query_param = "limit"
+    ordering = ("-pub_date", "-id")
+
+
+class SubscriptionCursorPagination(CursorPagination):
+    page_size_query_param = "limit"
+    ordering = ("username",)
+
+
+class CursorPaginationMixin:
+    cursor_pagination_class = None
+    cursor_actions = ()
+
+    @property
+    def paginator(self):
+        if self.cursor_pagination_class is None or (
+                self.action not in self.cursor_actions
+                and "cursor" not in self.request.query_params):
+            return super().paginator
+        if not isinstance(
+                getattr(self, "_paginator", None),
+                self.cursor_pagination_class):
+            self._paginator = self.cursor_pagination_class()
+        return self._paginator
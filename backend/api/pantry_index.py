@@ -0,0 +1,164 @@
+import time
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+from itertools import chain
+from threading import Lock
+
+from django.conf import settings
+from django.core.cache import cache
+
+from api.cache import bump_version, get_version
+from recipes.models import AmountIngredient, Recipe
+
+VERSION_NAME = "pantry"
+MAX_PENDING_CHANGES = 100
+MAX_RECORD_ATTEMPTS = 10
+CHANGES_TIMEOUT = 60 * 60
+
+
+def changes_key(version):
+    return f"pantry_changes:{version}"
+
+
+def record_changes(recipe_ids):
+    recipe_ids = list(recipe_ids)
+    for _ in range(MAX_RECORD_ATTEMPTS):
+        if cache.add(changes_key(bump_version(VERSION_NAME)), recipe_ids,
+                     CHANGES_TIMEOUT):
+            return
+    bump_version(VERSION_NAME)
+
+
+class PantryIndex:
+    def __init__(self):
+        self.lock = Lock()
+        self.version = None
+        self.built_at = None
+        self.postings = {}
+        self.ingredients = {}
+        self.tags = {}
+        self.cooking_times = {}
+
+    def load(self, recipe_ids=None):
+        amounts = AmountIngredient.objects.order_by()
+        recipes = Recipe.objects.order_by()
+        recipe_tags = Recipe.tags.through.objects.order_by()
+        if recipe_ids is not None:
+            amounts = amounts.filter(recipe_id__in=recipe_ids)
+            recipes = recipes.filter(id__in=recipe_ids)
+            recipe_tags = recipe_tags.filter(recipe_id__in=recipe_ids)
+        ingredients = defaultdict(list)
+        for recipe_id, ingredient_id in amounts.values_list(
+                "recipe_id", "ingredient_id").iterator():
+            ingredients[recipe_id].append(ingredient_id)
+        tags = defaultdict(set)
+        for recipe_id, tag_id in recipe_tags.values_list(
+                "recipe_id", "tag_id").iterator():
+            tags[recipe_id].add(tag_id)
+        cooking_times = dict(
+            recipes.values_list("id", "cooking_time").iterator())
+        return cooking_times, ingredients, tags
+
+    def build(self, version):
+        cooking_times, ingredients, tags = self.load()
+        postings = defaultdict(list)
+        for recipe_id in sorted(cooking_times):
+            for ingredient_id in ingredients.get(recipe_id, ()):
+                postings[ingredient_id].append(recipe_id)
+        self.postings = {
+            ingredient_id: array("q", recipe_ids)
+            for ingredient_id, recipe_ids in postings.items()
+        }
+        self.ingredients = {
+            recipe_id: tuple(ingredients.get(recipe_id, ()))
+            for recipe_id in cooking_times
+        }
+        self.tags = {
+            recipe_id: frozenset(tags.get(recipe_id, ()))
+            for recipe_id in cooking_times
+        }
+        self.cooking_times = cooking_times
+        self.version = version
+        self.built_at = time.monotonic()
+
+    def is_expired(self):
+        return self.built_at is None or (
+            time.monotonic() - self.built_at > settings.INDEX_MAX_AGE)
+
+    def remove(self, recipe_id):
+        for ingredient_id in self.ingredients.pop(recipe_id, ()):
+            recipe_ids = self.postings[ingredient_id]
+            position = bisect_left(recipe_ids, recipe_id)
+            if (position < len(recipe_ids)
+                    and recipe_ids[position] == recipe_id):
+                del recipe_ids[position]
+        self.tags.pop(recipe_id, None)
+        self.cooking_times.pop(recipe_id, None)
+
+    def apply(self, recipe_ids, version):
+        cooking_times, ingredients, tags = self.load(recipe_ids)
+        for recipe_id in recipe_ids:
+            self.remove(recipe_id)
+        for recipe_id, cooking_time in cooking_times.items():
+            recipe_ingredients = tuple(set(ingredients.get(recipe_id, ())))
+            for ingredient_id in recipe_ingredients:
+                insort(
+                    self.postings.setdefault(ingredient_id, array("q")),
+                    recipe_id,
+                )
+            self.ingredients[recipe_id] = recipe_ingredients
+            self.tags[recipe_id] = frozenset(tags.get(recipe_id, ()))
+            self.cooking_times[recipe_id] = cooking_time
+        self.version = version
+
+    def get_changes(self, version):
+        if (self.version is None or version < self.version
+                or version - self.version > MAX_PENDING_CHANGES):
+            return None
+        keys = [
+            changes_key(pending)
+            for pending in range(self.version + 1, version + 1)
+        ]
+        changes = cache.get_many(keys)
+        if len(changes) != len(keys):
+            return None
+        return set(chain.from_iterable(changes.values()))
+
+    def sync(self):
+        version = get_version(VERSION_NAME)
+        if self.is_expired():
+            self.build(version)
+            return
+        if self.version == version:
+            return
+        changes = self.get_changes(version)
+        if changes is None:
+            self.build(version)
+        else:
+            self.apply(changes, version)
+
+    def search(self, ingredient_ids, tag_ids=None, max_cooking_time=None,
+               min_coverage=0):
+        with self.lock:
+            self.sync()
+            matches = Counter(chain.from_iterable(
+                self.postings.get(ingredient_id, ())
+                for ingredient_id in set(ingredient_ids)
+            ))
+            results = []
+            for recipe_id, matched in matches.items():
+                coverage = matched / len(self.ingredients[recipe_id])
+                if coverage < min_coverage:
+                    continue
+                if tag_ids and self.tags[recipe_id].isdisjoint(tag_ids):
+                    continue
+                if (max_cooking_time is not None
+                        and self.cooking_times[recipe_id] > max_cooking_time):
+                    continue
+                results.append((coverage, matched, recipe_id))
+        results.sort(reverse=True)
+        return results
+
+
+pantry_index = PantryIndex()
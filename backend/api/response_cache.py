@@ -0,0 +1,57 @@
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+
+from api.cache import get_version
+
+STATS_KEYS = {
+    "hits": "response_cache:hits",
+    "misses": "response_cache:misses",
+}
+
+
+def get_cache_key(request, prefix):
+    query = urlencode(sorted(
+        (key, value)
+        for key, values in request.query_params.lists()
+        for value in values
+    ))
+    return ":".join((
+        "response_cache",
+        prefix,
+        str(get_version("catalog")),
+        str(get_version("popularity")),
+        request.build_absolute_uri(request.path),
+        query,
+    ))
+
+
+def count(name):
+    key = STATS_KEYS[name]
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+
+
+def get_stats():
+    values = cache.get_many(STATS_KEYS.values())
+    return {name: values.get(key, 0) for name, key in STATS_KEYS.items()}
+
+
+def reset_stats():
+    cache.delete_many(STATS_KEYS.values())
+
+
+def get_or_render(request, prefix, render):
+    key = get_cache_key(request, prefix)
+    data = cache.get(key)
+    if data is not None:
+        count("hits")
+        return data, True
+    count("misses")
+    data = render()
+    cache.set(key, data, settings.RESPONSE_CACHE_TIMEOUT)
+    return data, False
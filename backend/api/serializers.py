@@ -1,8 +1,13 @@
-from django.db import transaction
-from drf_extra_fields.fields import Base64ImageField
+from django.db import IntegrityError, transaction
+from django.db.models import F, Prefetch, Value, Window
+from django.db.models.functions import RowNumber
 from rest_framework import serializers, status
+from rest_framework.settings import api_settings
 
-from recipes.constants import MAX_VALUE, MIN_VALUE
+from api.fields import (BulkPrimaryKeyRelatedField, ImageSrcsetField,
+                        StreamingBase64ImageField)
+from api.tag_index import tag_index
+from recipes.constants import MAX_BULK_SIZE, MAX_VALUE, MIN_VALUE
 from recipes.models import (AmountIngredient, Favorite, Ingredient, Recipe,
                             ShoppingCart, Tag)
 from users.models import Subscription, User
@@ -23,13 +28,25 @@ class UserSerializer(serializers.ModelSerializer):
         )
 
     def get_is_subscribed(self, obj):
+        is_subscribed = getattr(obj, "is_subscribed", None)
+        if is_subscribed is not None:
+            return is_subscribed
+        return obj.id in self.get_followed_author_ids()
+
+    def get_followed_author_ids(self):
         request = self.context.get("request")
-        return (request.user.is_authenticated
-                and request.user.followed_users.filter(author=obj).exists())
+        if request is None or not request.user.is_authenticated:
+            return frozenset()
+        if not hasattr(request, "followed_author_ids"):
+            request.followed_author_ids = frozenset(
+                request.user.followed_users.values_list(
+                    "author_id", flat=True)
+            )
+        return request.followed_author_ids
 
 
 class SubscribeSerializer(UserSerializer):
-    recipes_count = serializers.ReadOnlyField(source="recipes.count")
+    recipes_count = serializers.IntegerField(read_only=True)
     recipes = serializers.SerializerMethodField()
 
     class Meta(UserSerializer.Meta):
@@ -39,17 +56,50 @@ class SubscribeSerializer(UserSerializer):
         )
         read_only_fields = ("email", "username", "first_name", "last_name")
 
-    def get_recipes(self, obj):
-        queryset = obj.recipes.all()
-        recipes_limit = self.context["request"].GET.get("recipes_limit")
+    @staticmethod
+    def annotate_queryset(queryset, request):
+        recipes = Recipe.objects.with_renditions()
+        recipes_limit = request.GET.get("recipes_limit")
         if recipes_limit and recipes_limit.isdigit():
-            queryset = queryset[: int(recipes_limit)]
+            recipes = recipes.annotate(
+                row_number=Window(
+                    RowNumber(),
+                    partition_by=F("author"),
+                    order_by=F("pub_date").desc(),
+                )
+            ).filter(row_number__lte=int(recipes_limit))
+        return queryset.annotate(
+            is_subscribed=Value(True),
+        ).prefetch_related(
+            Prefetch("recipes", queryset=recipes, to_attr="limited_recipes")
+        )
+
+    def get_recipes(self, obj):
         return RecipeShortSerializer(
-            queryset, many=True, context=self.context
+            obj.limited_recipes, many=True, context=self.context
         ).data
 
 
-class SubscribeCreateSerializer(serializers.ModelSerializer):
+class UniqueCreateMixin:
+    unique_error_message = None
+
+    def create(self, validated_data):
+        try:
+            with transaction.atomic():
+                return super().create(validated_data)
+        except IntegrityError:
+            raise serializers.ValidationError(
+                {api_settings.NON_FIELD_ERRORS_KEY: [
+                    self.unique_error_message]},
+                code=status.HTTP_400_BAD_REQUEST,
+            )
+
+
+class SubscribeCreateSerializer(UniqueCreateMixin,
+                                serializers.ModelSerializer):
+    user = serializers.HiddenField(default=serializers.CurrentUserDefault())
+    unique_error_message = "Вы уже подписаны на этого пользователя!"
+
     class Meta:
         model = Subscription
         fields = ("user", "author")
@@ -57,12 +107,6 @@ class SubscribeCreateSerializer(serializers.ModelSerializer):
     def validate(self, data):
         user_id = data.get("user").id
         author_id = data.get("author").id
-        if Subscription.objects.filter(
-                author=author_id, user=user_id).exists():
-            raise serializers.ValidationError(
-                detail="Вы уже подписаны на этого пользователя!",
-                code=status.HTTP_400_BAD_REQUEST,
-            )
         if user_id == author_id:
             raise serializers.ValidationError(
                 detail="Вы не можете подписаться на самого себя!",
@@ -71,9 +115,11 @@ class SubscribeCreateSerializer(serializers.ModelSerializer):
         return data
 
     def to_representation(self, instance):
-        return SubscribeSerializer(
-            instance.author, context=self.context
-        ).data
+        author = SubscribeSerializer.annotate_queryset(
+            User.objects.filter(pk=instance.author_id),
+            self.context["request"],
+        ).get()
+        return SubscribeSerializer(author, context=self.context).data
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -100,9 +146,27 @@ class AmountIngredientSerializer(serializers.ModelSerializer):
         fields = ("id", "name", "measurement_unit", "amount")
 
 
+class BulkRelatedListSerializer(serializers.ListSerializer):
+    def to_internal_value(self, data):
+        items = super().to_internal_value(data)
+        errors = [{} for _ in items]
+        for name, field in self.child.fields.items():
+            if not isinstance(field, BulkPrimaryKeyRelatedField):
+                continue
+            objects, field_errors = field.resolve(
+                [item[field.source] for item in items])
+            for item, item_errors, error in zip(items, errors, field_errors):
+                if error:
+                    item_errors[name] = [error]
+                else:
+                    item[field.source] = objects[item[field.source]]
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return items
+
+
 class CreateAmountIngredientSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all(), )
+    id = BulkPrimaryKeyRelatedField(queryset=Ingredient.objects.all())
     amount = serializers.IntegerField(
         min_value=MIN_VALUE,
         max_value=MAX_VALUE,
@@ -114,18 +178,21 @@ class CreateAmountIngredientSerializer(serializers.ModelSerializer):
     class Meta:
         fields = ("id", "amount")
         model = AmountIngredient
+        list_serializer_class = BulkRelatedListSerializer
 
 
 class RecipeReadSerializer(serializers.ModelSerializer):
-    image = Base64ImageField()
+    image = StreamingBase64ImageField(rendition="detail")
+    image_srcset = ImageSrcsetField()
+    image_webp_srcset = ImageSrcsetField(extension="webp")
     author = UserSerializer(read_only=True)
     tags = TagSerializer(many=True, read_only=True)
     ingredients = AmountIngredientSerializer(
         many=True,
         source="recipe_ingredient",
     )
-    is_favorited = serializers.SerializerMethodField()
-    is_in_shopping_cart = serializers.SerializerMethodField()
+    is_favorited = serializers.BooleanField(read_only=True)
+    is_in_shopping_cart = serializers.BooleanField(read_only=True)
 
     class Meta:
         model = Recipe
@@ -136,28 +203,21 @@ class RecipeReadSerializer(serializers.ModelSerializer):
             "ingredients",
             "is_favorited",
             "is_in_shopping_cart",
+            "favorites_count",
             "name",
             "image",
+            "image_srcset",
+            "image_webp_srcset",
             "text",
             "cooking_time",
         )
 
-    def get_is_favorited(self, obj):
-        return self.get_is_in_user_field(obj, "recipes_favorite_related")
-
-    def get_is_in_shopping_cart(self, obj):
-        return self.get_is_in_user_field(obj, "recipes_shoppingcart_related")
-
-    def get_is_in_user_field(self, obj, field):
-        request = self.context.get("request")
-        return (request.user.is_authenticated and getattr(
-            request.user, field).filter(recipe=obj).exists())
-
 
 class RecipeCreateSerializer(serializers.ModelSerializer):
-    image = Base64ImageField()
+    image = StreamingBase64ImageField(
+        upload_to=Recipe._meta.get_field("image").upload_to)
     author = UserSerializer(read_only=True)
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = BulkPrimaryKeyRelatedField(
         queryset=Tag.objects.all(), many=True
     )
     ingredients = CreateAmountIngredientSerializer(many=True, write_only=True)
@@ -233,40 +293,69 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         self.create_ingredients(recipe, ingredients)
         return recipe
 
+    @staticmethod
+    def update_ingredients(recipe, ingredients):
+        amounts = {
+            ingredient["id"].id: ingredient["amount"]
+            for ingredient in ingredients
+        }
+        to_update, to_delete = [], []
+        for amount_ingredient in recipe.recipe_ingredient.all():
+            amount = amounts.pop(amount_ingredient.ingredient_id, None)
+            if amount is None:
+                to_delete.append(amount_ingredient.id)
+            elif amount != amount_ingredient.amount:
+                amount_ingredient.amount = amount
+                to_update.append(amount_ingredient)
+        if to_delete:
+            AmountIngredient.objects.filter(id__in=to_delete).delete()
+        if to_update:
+            AmountIngredient.objects.bulk_update(to_update, ("amount",))
+        AmountIngredient.objects.bulk_create(
+            AmountIngredient(
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount)
+            for ingredient_id, amount in amounts.items()
+        )
+
     @transaction.atomic
     def update(self, instance, validated_data):
-        instance.tags.clear()
         instance.tags.set(validated_data.pop("tags"))
-        instance.ingredients.clear()
-        ingredients = validated_data.pop("ingredients")
-        self.create_ingredients(instance, ingredients)
+        self.update_ingredients(instance, validated_data.pop("ingredients"))
         return super().update(instance, validated_data)
 
     def to_representation(self, recipe):
+        recipe = Recipe.objects.with_related().with_user_flags(
+            self.context["request"].user
+        ).get(pk=recipe.pk)
         return RecipeReadSerializer(recipe, context=self.context).data
 
 
 class RecipeShortSerializer(serializers.ModelSerializer):
-    image = Base64ImageField()
+    image = StreamingBase64ImageField(rendition="short")
+    image_srcset = ImageSrcsetField()
+    image_webp_srcset = ImageSrcsetField(extension="webp")
 
     class Meta:
         model = Recipe
-        fields = ("id", "name", "image", "cooking_time")
+        fields = (
+            "id",
+            "name",
+            "image",
+            "image_srcset",
+            "image_webp_srcset",
+            "cooking_time",
+        )
+
 
+class ShoppingCartCreateDeleteSerializer(UniqueCreateMixin,
+                                         serializers.ModelSerializer):
+    user = serializers.HiddenField(default=serializers.CurrentUserDefault())
+    unique_error_message = "Рецепт уже добавлен"
 
-class ShoppingCartCreateDeleteSerializer(serializers.ModelSerializer):
     class Meta:
         model = ShoppingCart
         fields = ("user", "recipe")
 
-    def validate(self, data):
-        user_id = data.get("user").id
-        recipe_id = data.get("recipe").id
-        if self.Meta.model.objects.filter(user=user_id,
-                                          recipe=recipe_id).exists():
-            raise serializers.ValidationError("Рецепт уже добавлен")
-        return data
-
     def to_representation(self, instance):
         serializer = RecipeShortSerializer(
             instance.recipe, context=self.context
@@ -277,3 +366,59 @@ class ShoppingCartCreateDeleteSerializer(serializers.ModelSerializer):
 class FavoriteCreateDeleteSerializer(ShoppingCartCreateDeleteSerializer):
     class Meta(ShoppingCartCreateDeleteSerializer.Meta):
         model = Favorite
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=MIN_VALUE),
+        allow_empty=False,
+        max_length=MAX_BULK_SIZE,
+        error_messages={
+            "empty": "Список рецептов не может быть пустым!",
+            "max_length":
+            f"Не больше {MAX_BULK_SIZE} рецептов за один запрос.",
+        },
+    )
+
+    def validate_recipes(self, recipes):
+        return list(dict.fromkeys(recipes))
+
+
+class PantryQuerySerializer(serializers.Serializer):
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=MIN_VALUE),
+        allow_empty=False,
+        max_length=MAX_BULK_SIZE,
+    )
+    tags = serializers.ListField(
+        child=serializers.CharField(),
+        required=False,
+    )
+    max_cooking_time = serializers.IntegerField(
+        min_value=MIN_VALUE,
+        required=False,
+    )
+    min_coverage = serializers.FloatField(
+        min_value=0,
+        max_value=1,
+        default=0,
+    )
+
+    def validate_tags(self, tags):
+        ids = tag_index.get_ids()
+        unknown = [slug for slug in tags if slug not in ids]
+        if unknown:
+            raise serializers.ValidationError(
+                f"Теги не найдены: {', '.join(unknown)}")
+        return {ids[slug] for slug in tags}
+
+
+class PantryRecipeSerializer(RecipeReadSerializer):
+    coverage = serializers.FloatField(read_only=True)
+    matched_ingredients = serializers.IntegerField(read_only=True)
+
+    class Meta(RecipeReadSerializer.Meta):
+        fields = RecipeReadSerializer.Meta.fields + (
+            "coverage",
+            "matched_ingredients",
+        )
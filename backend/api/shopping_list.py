@@ -0,0 +1,129 @@
+import csv
+import io
+import os
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
+from django.http import HttpResponse, StreamingHttpResponse
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+from api.cache import get_version
+from recipes.models import AmountIngredient
+
+CACHE_TIMEOUT = 60 * 60
+CSV_HEADER = ("Ингредиент", "Единица измерения", "Количество")
+PDF_TITLE = "Список покупок"
+PDF_FONT_NAME = "ShoppingListFont"
+PDF_FALLBACK_FONT = "Helvetica"
+
+
+def get_shopping_list(user):
+    return (
+        AmountIngredient.objects
+        .filter(recipe__recipes_shoppingcart_related__user=user)
+        .values_list(
+            "ingredient__name",
+            "ingredient__measurement_unit",
+        )
+        .annotate(amount=Sum("amount"))
+        .order_by("ingredient__name")
+        .iterator()
+    )
+
+
+def render_txt(rows):
+    separator = ""
+    for row in rows:
+        yield (separator + "\t".join(map(str, row))).encode()
+        separator = "\n"
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def render_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_HEADER).encode()
+    for row in rows:
+        yield writer.writerow(row).encode()
+
+
+def get_pdf_font():
+    if PDF_FONT_NAME in pdfmetrics.getRegisteredFontNames():
+        return PDF_FONT_NAME
+    font_path = settings.SHOPPING_LIST_PDF_FONT
+    if not font_path or not os.path.exists(font_path):
+        return PDF_FALLBACK_FONT
+    pdfmetrics.registerFont(TTFont(PDF_FONT_NAME, font_path))
+    return PDF_FONT_NAME
+
+
+def render_pdf(rows):
+    buffer = io.BytesIO()
+    font = get_pdf_font()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
+    margin = 50
+    y = height - margin
+    pdf.setFont(font, 16)
+    pdf.drawString(margin, y, PDF_TITLE)
+    y -= 30
+    pdf.setFont(font, 12)
+    for name, measurement_unit, amount in rows:
+        if y < margin:
+            pdf.showPage()
+            pdf.setFont(font, 12)
+            y = height - margin
+        pdf.drawString(margin, y, f"• {name} ({measurement_unit}) — {amount}")
+        y -= 20
+    pdf.save()
+    yield buffer.getvalue()
+
+
+FORMATS = {
+    "txt": (render_txt, "text/plain; charset=utf-8"),
+    "csv": (render_csv, "text/csv; charset=utf-8"),
+    "pdf": (render_pdf, "application/pdf"),
+}
+DEFAULT_FORMAT = "txt"
+
+
+def get_cache_key(user, file_format):
+    return ":".join((
+        "shopping_list",
+        str(user.id),
+        file_format,
+        str(get_version("cart", user.id)),
+        str(get_version("catalog")),
+    ))
+
+
+def cache_chunks(chunks, cache_key):
+    rendered = []
+    for chunk in chunks:
+        rendered.append(chunk)
+        yield chunk
+    cache.set(cache_key, b"".join(rendered), CACHE_TIMEOUT)
+
+
+def create_file_response(user, file_format):
+    render, content_type = FORMATS[file_format]
+    cache_key = get_cache_key(user, file_format)
+    content = cache.get(cache_key)
+    if content is not None:
+        response = HttpResponse(content, content_type=content_type)
+    else:
+        response = StreamingHttpResponse(
+            cache_chunks(render(get_shopping_list(user)), cache_key),
+            content_type=content_type,
+        )
+    response["Content-Disposition"] = (
+        f'attachment; filename="shopping_cart.{file_format}"'
+    )
+    return response
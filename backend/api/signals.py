@@ -0,0 +1,159 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from api.cache import bump_version
+from api.ingredient_index import ingredient_index
+from api.pantry_index import record_changes
+from api.tag_index import tag_index
+from recipes import renditions, search
+from recipes.counters import change_related_counters
+from recipes.models import (AmountIngredient, Favorite, Ingredient, Recipe,
+                            ShoppingCart, Tag)
+from users.models import Subscription, User
+
+RELATION_VERSIONS = {
+    Favorite: "favorites",
+    ShoppingCart: "cart",
+}
+
+
+def bump_on_commit(name, *parts):
+    transaction.on_commit(lambda: bump_version(name, *parts))
+
+
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+def bump_relation_version(sender, instance, **kwargs):
+    bump_on_commit(RELATION_VERSIONS[sender], instance.user_id)
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def bump_subscriptions_version(sender, instance, **kwargs):
+    bump_on_commit("subscriptions", instance.user_id)
+
+
+@receiver(post_save, sender=User)
+def bump_user_version(sender, instance, created, update_fields=None,
+                      **kwargs):
+    if update_fields and set(update_fields) == {"last_login"}:
+        return
+    bump_on_commit("user", instance.id)
+    if not created:
+        bump_on_commit("catalog")
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def bump_tags_version(sender, **kwargs):
+    tag_index.invalidate()
+    bump_on_commit("tags")
+    bump_on_commit("catalog")
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def bump_recipe_tags_version(sender, action, **kwargs):
+    if action.startswith("post_"):
+        bump_on_commit("catalog")
+
+
+@receiver(post_save, sender=Recipe)
+def index_recipe_search(sender, instance, **kwargs):
+    transaction.on_commit(partial(search.index_recipes, [instance.id]))
+
+
+@receiver(post_delete, sender=Recipe)
+def delete_recipe_search(sender, instance, **kwargs):
+    transaction.on_commit(partial(search.delete_recipes, [instance.id]))
+
+
+@receiver(post_save, sender=AmountIngredient)
+@receiver(post_delete, sender=AmountIngredient)
+def index_amount_ingredient_search(sender, instance, **kwargs):
+    transaction.on_commit(
+        partial(search.index_recipes, [instance.recipe_id]))
+
+
+@receiver(post_save, sender=Ingredient)
+def index_ingredient_search(sender, instance, created, **kwargs):
+    if created:
+        return
+    transaction.on_commit(lambda: search.index_recipes(
+        AmountIngredient.objects.filter(ingredient=instance)
+        .values_list("recipe_id", flat=True).distinct()
+    ))
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=AmountIngredient)
+@receiver(post_delete, sender=AmountIngredient)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def bump_catalog_version(sender, **kwargs):
+    bump_on_commit("catalog")
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredient_index(sender, **kwargs):
+    ingredient_index.invalidate()
+    bump_on_commit("ingredients")
+
+
+@receiver(post_save, sender=Recipe)
+def enqueue_image_renditions(sender, instance, created, **kwargs):
+    loaded_image = getattr(instance, "loaded_image", None)
+    instance.loaded_image = instance.image.name
+    if not created and instance.image.name == loaded_image:
+        return
+    if instance.image:
+        renditions.enqueue(instance.image.name)
+    renditions.cleanup(loaded_image)
+
+
+@receiver(post_delete, sender=Recipe)
+def cleanup_image_renditions(sender, instance, **kwargs):
+    renditions.cleanup(instance.image.name)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def update_counters(sender, instance, signal, created=False, **kwargs):
+    if signal is post_save and not created:
+        return
+    change_related_counters(sender, [instance], 1 if created else -1)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def record_pantry_recipe_changes(sender, instance, **kwargs):
+    transaction.on_commit(partial(record_changes, [instance.id]))
+
+
+@receiver(post_save, sender=AmountIngredient)
+@receiver(post_delete, sender=AmountIngredient)
+def record_pantry_ingredient_changes(sender, instance, **kwargs):
+    transaction.on_commit(partial(record_changes, [instance.recipe_id]))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def record_pantry_tag_changes(sender, instance, action, pk_set, reverse,
+                              **kwargs):
+    if not action.startswith("post_"):
+        return
+    if not reverse:
+        transaction.on_commit(partial(record_changes, [instance.id]))
+    elif pk_set is None:
+        bump_on_commit("pantry")
+    else:
+        transaction.on_commit(partial(record_changes, list(pk_set)))
@@ -0,0 +1,35 @@
+import time
+from threading import Lock
+
+from django.conf import settings
+
+from api.cache import get_version
+from recipes.models import Tag
+
+
+class TagSlugIndex:
+    def __init__(self):
+        self.lock = Lock()
+        self.version = None
+        self.built_at = None
+        self.ids = {}
+
+    def invalidate(self):
+        self.version = None
+
+    def is_stale(self, version):
+        return self.version != version or (
+            time.monotonic() - self.built_at > settings.INDEX_MAX_AGE)
+
+    def get_ids(self):
+        version = get_version("tags")
+        if self.is_stale(version):
+            with self.lock:
+                if self.is_stale(version):
+                    self.ids = dict(Tag.objects.values_list("slug", "id"))
+                    self.version = version
+                    self.built_at = time.monotonic()
+        return self.ids
+
+
+tag_index = TagSlugIndex()
@@ -0,0 +1,408 @@
+import base64
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from io import BytesIO
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.core.cache import cache, caches
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from api.cache import get_version
+from api.pantry_index import changes_key, pantry_index, record_changes
+from recipes.models import (AmountIngredient, Favorite, Ingredient, Recipe,
+                            ShoppingCart, Tag)
+from users.models import Subscription, User
+
+RECIPES_COUNT = 12
+FEED_AUTHORS_COUNT = 1000
+FEED_RECIPES_PER_AUTHOR = 5
+FEED_PAGES = 50
+FEED_P95_BUDGET = 0.1
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def clear_caches():
+    for alias_cache in caches.all():
+        alias_cache.clear()
+
+
+def get_image_data():
+    buffer = BytesIO()
+    Image.new("RGB", (50, 50), (255, 0, 0)).save(buffer, "PNG")
+    return "data:image/png;base64," + base64.b64encode(
+        buffer.getvalue()).decode()
+
+
+@override_settings(
+    IMAGE_RENDITION_WORKER="queue", MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class APITestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create_user(
+                email=f"user{index}@foodgram.ru",
+                username=f"user{index}",
+                first_name="Имя",
+                last_name="Фамилия",
+                password="Pass-12345",
+            )
+            for index in range(5)
+        ]
+        cls.user = cls.users[-1]
+        cls.tags = [
+            Tag.objects.create(
+                name=f"Тег {index}", color=f"#00000{index}",
+                slug=f"tag{index}")
+            for index in range(3)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f"Ингредиент {index}", measurement_unit="г")
+            for index in range(10)
+        ]
+        cls.recipes = []
+        for index in range(RECIPES_COUNT):
+            recipe = Recipe.objects.create(
+                author=cls.users[index % 4],
+                name=f"Рецепт {index}",
+                text="Описание",
+                cooking_time=5 + index,
+                image="recipes/images/recipe.png",
+            )
+            recipe.tags.set(cls.tags[:1 + index % 3])
+            AmountIngredient.objects.bulk_create(
+                AmountIngredient(
+                    recipe=recipe,
+                    ingredient=cls.ingredients[(index + shift) % 10],
+                    amount=shift + 1,
+                )
+                for shift in range(3)
+            )
+            cls.recipes.append(recipe)
+        for recipe in cls.recipes[:3]:
+            Favorite.objects.create(user=cls.user, recipe=recipe)
+            ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+        for author in cls.users[:3]:
+            Subscription.objects.create(user=cls.user, author=author)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        clear_caches()
+        self.guest_client = APIClient()
+        self.authorized_client = APIClient()
+        self.authorized_client.force_authenticate(self.user)
+
+
+class RecipeQueryCountTest(APITestCase):
+    def test_list_query_count_does_not_depend_on_page_size(self):
+        for limit in (1, 6, RECIPES_COUNT):
+            with self.subTest(limit=limit):
+                clear_caches()
+                with self.assertNumQueries(6):
+                    response = self.authorized_client.get(
+                        "/api/recipes/", {"limit": limit})
+                self.assertEqual(len(response.data["results"]), limit)
+
+    def test_user_flags_are_annotated(self):
+        response = self.authorized_client.get(
+            "/api/recipes/", {"is_favorited": 1, "limit": RECIPES_COUNT})
+        self.assertEqual(response.data["count"], 3)
+        for recipe in response.data["results"]:
+            self.assertTrue(recipe["is_favorited"])
+            self.assertTrue(recipe["is_in_shopping_cart"])
+
+
+class RecipeIngredientsQueryCountTest(APITestCase):
+    def test_list_prefetches_ingredients(self):
+        with self.assertNumQueries(6):
+            response = self.authorized_client.get(
+                "/api/recipes/", {"limit": RECIPES_COUNT})
+        for recipe in response.data["results"]:
+            self.assertEqual(len(recipe["ingredients"]), 3)
+
+    def test_retrieve_query_count(self):
+        with self.assertNumQueries(6):
+            response = self.authorized_client.get(
+                f"/api/recipes/{self.recipes[0].id}/")
+        self.assertEqual(len(response.data["ingredients"]), 3)
+
+    def test_create_query_count(self):
+        data = {
+            "ingredients": [
+                {"id": ingredient.id, "amount": index + 1}
+                for index, ingredient in enumerate(self.ingredients[:5])
+            ],
+            "tags": [tag.id for tag in self.tags],
+            "image": get_image_data(),
+            "name": "Новый рецепт",
+            "text": "Описание",
+            "cooking_time": 10,
+        }
+        with self.assertNumQueries(18):
+            response = self.authorized_client.post(
+                "/api/recipes/", data, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data["ingredients"]), 5)
+
+
+@skipUnless(connection.vendor == "sqlite", "Планы запросов SQLite")
+class IndexUsageTest(APITestCase):
+    def assertUsesIndex(self, queryset, index_name):
+        self.assertIn(index_name, queryset.explain())
+
+    def test_recipes_by_author(self):
+        self.assertUsesIndex(
+            Recipe.objects.filter(author=self.users[0]).order_by("-pub_date"),
+            "recipe_author_pub_date_idx",
+        )
+
+    def test_relations_by_recipe(self):
+        for model in (Favorite, ShoppingCart):
+            with self.subTest(model=model.__name__):
+                self.assertUsesIndex(
+                    model.objects.filter(recipe=self.recipes[0]),
+                    f"{model.__name__.lower()}_recipe_user_idx",
+                )
+
+    def test_subscribers_by_author(self):
+        self.assertUsesIndex(
+            Subscription.objects.filter(author=self.users[0]),
+            "subscription_author_user_idx",
+        )
+
+    def test_ingredient_name_prefix(self):
+        self.assertUsesIndex(
+            Ingredient.objects.filter(name__istartswith="ингр"),
+            "ingredient_name_prefix_idx",
+        )
+
+
+class RecipeTagFilterTest(APITestCase):
+    def get_pages(self, params, limit=3):
+        ids = []
+        page = 1
+        while True:
+            response = self.authorized_client.get(
+                "/api/recipes/", {**params, "limit": limit, "page": page})
+            self.assertEqual(response.status_code, 200)
+            ids.extend(recipe["id"] for recipe in response.data["results"])
+            if not response.data["next"]:
+                return response.data["count"], ids
+            page += 1
+
+    def get_expected_ids(self, slugs, mode):
+        check = all if mode == "all" else any
+        return {
+            recipe.id for recipe in self.recipes
+            if check(
+                slug in {tag.slug for tag in recipe.tags.all()}
+                for slug in slugs)
+        }
+
+    def test_pages_have_no_duplicates(self):
+        for mode, slugs, expected in (
+            ("any", ["tag1", "tag2"], 8),
+            ("all", ["tag1", "tag2"], 4),
+            ("any", ["tag0", "tag1", "tag2"], RECIPES_COUNT),
+            ("all", ["tag0", "tag2"], 4),
+        ):
+            with self.subTest(mode=mode, slugs=slugs):
+                count, ids = self.get_pages(
+                    {"tags": slugs, "tags_mode": mode})
+                self.assertEqual(count, expected)
+                self.assertEqual(len(ids), len(set(ids)))
+                self.assertEqual(
+                    set(ids), self.get_expected_ids(slugs, mode))
+
+    def test_filter_uses_exists_without_distinct(self):
+        for mode in ("any", "all"):
+            with self.subTest(mode=mode):
+                clear_caches()
+                with CaptureQueriesContext(connection) as context:
+                    self.authorized_client.get("/api/recipes/", {
+                        "tags": ["tag1", "tag2"], "tags_mode": mode})
+                self.assertEqual(len(context.captured_queries), 6)
+                for query in context.captured_queries:
+                    self.assertNotIn("DISTINCT", query["sql"])
+                    self.assertNotIn("GROUP BY", query["sql"])
+
+    def test_tags_created_elsewhere_are_accepted(self):
+        self.authorized_client.get("/api/recipes/", {"tags": "tag0"})
+        Tag.objects.bulk_create(
+            [Tag(name="Новый тег", color="#FFFFFF", slug="new")])
+        with override_settings(INDEX_MAX_AGE=0):
+            response = self.authorized_client.get(
+                "/api/recipes/", {"tags": "new"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["count"], 0)
+
+
+class RecipeFeedTest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.follower = User.objects.create_user(
+            email="follower@foodgram.ru", username="follower",
+            first_name="Имя", last_name="Фамилия", password="Pass-12345")
+        authors = User.objects.bulk_create(
+            User(
+                email=f"author{index}@foodgram.ru",
+                username=f"author{index}",
+                first_name="Имя",
+                last_name="Фамилия",
+            )
+            for index in range(FEED_AUTHORS_COUNT)
+        )
+        now = timezone.now()
+        Recipe.objects.bulk_create(
+            Recipe(
+                author=author,
+                name=f"Рецепт {index}",
+                text="Описание",
+                cooking_time=10,
+                image="recipes/images/recipe.png",
+                pub_date=now - timedelta(minutes=index * 7 % 5000),
+            )
+            for index, author in enumerate(
+                author for author in authors
+                for _ in range(FEED_RECIPES_PER_AUTHOR))
+        )
+        Subscription.objects.bulk_create(
+            Subscription(user=cls.follower, author=author)
+            for author in authors
+        )
+
+    def test_feed_is_ordered_and_complete(self):
+        self.authorized_client.force_authenticate(self.follower)
+        url = "/api/recipes/feed/?limit=100"
+        ids = []
+        while url:
+            response = self.authorized_client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(recipe["id"] for recipe in response.data["results"])
+            url = response.data["next"]
+        pub_dates = dict(
+            Recipe.objects.filter(author__in=Subscription.objects.filter(
+                user=self.follower).values("author"))
+            .values_list("id", "pub_date"))
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual(set(ids), set(pub_dates))
+        keys = [(pub_dates[id], id) for id in ids]
+        self.assertEqual(keys, sorted(keys, reverse=True))
+
+    def test_feed_p95_latency(self):
+        self.authorized_client.force_authenticate(self.follower)
+        url = "/api/recipes/feed/?limit=10"
+        timings = []
+        for _ in range(FEED_PAGES):
+            started = time.perf_counter()
+            response = self.authorized_client.get(url)
+            timings.append(time.perf_counter() - started)
+            url = response.data["next"]
+        timings.sort()
+        p95 = timings[int(len(timings) * 0.95) - 1]
+        self.assertLess(p95, FEED_P95_BUDGET)
+
+
+class BulkRelationsTest(APITestCase):
+    def test_bulk_delete_query_count_does_not_depend_on_size(self):
+        for recipes in (self.recipes[:1], self.recipes[1:3]):
+            ids = [recipe.id for recipe in recipes]
+            with self.assertNumQueries(4):
+                response = self.authorized_client.delete(
+                    "/api/recipes/favorite/", {"recipes": ids}, format="json")
+            self.assertEqual(
+                [item["status"] for item in response.data],
+                ["deleted"] * len(ids))
+        self.assertFalse(Favorite.objects.filter(user=self.user).exists())
+        self.assertEqual(
+            set(Recipe.objects.filter(
+                id__in=[recipe.id for recipe in self.recipes[:3]]
+            ).values_list("favorites_count", flat=True)),
+            {0},
+        )
+
+
+class ResponseCacheTest(APITestCase):
+    def get_favorites_count(self, recipe):
+        response = self.guest_client.get(
+            "/api/recipes/", {"limit": RECIPES_COUNT, "ordering": "popular"})
+        counts = {
+            item["id"]: item["favorites_count"]
+            for item in response.data["results"]
+        }
+        return response["X-Cache"], counts[recipe.id]
+
+    def test_favorite_invalidates_anonymous_list(self):
+        recipe = self.recipes[-1]
+        self.assertEqual(self.get_favorites_count(recipe), ("MISS", 0))
+        self.assertEqual(self.get_favorites_count(recipe), ("HIT", 0))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.authorized_client.post(
+                f"/api/recipes/{recipe.id}/favorite/")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.get_favorites_count(recipe), ("MISS", 1))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.authorized_client.delete(
+                "/api/recipes/favorite/", {"recipes": [recipe.id]},
+                format="json")
+        self.assertEqual(self.get_favorites_count(recipe), ("MISS", 0))
+
+
+class PantryIndexTest(APITestCase):
+    def get_coverages(self):
+        response = self.authorized_client.get(
+            "/api/recipes/pantry/",
+            {"ingredients": self.ingredients[0].id, "limit": RECIPES_COUNT})
+        self.assertEqual(response.status_code, 200)
+        return {
+            recipe["id"]: recipe["coverage"]
+            for recipe in response.data["results"]
+        }
+
+    def test_incremental_sync_matches_changes(self):
+        with override_settings(INDEX_MAX_AGE=0):
+            self.get_coverages()
+        edited, deleted, removed = (
+            self.recipes[1], self.recipes[0], self.recipes[8])
+        with self.captureOnCommitCallbacks(execute=True):
+            AmountIngredient.objects.filter(recipe=edited).delete()
+            AmountIngredient.objects.create(
+                recipe=edited, ingredient=self.ingredients[0], amount=1)
+            AmountIngredient.objects.filter(
+                recipe=removed, ingredient=self.ingredients[0]).delete()
+            deleted.delete()
+        with patch.object(pantry_index, "build") as build:
+            coverages = self.get_coverages()
+        build.assert_not_called()
+        self.assertEqual(coverages, {
+            edited.id: 1.0,
+            self.recipes[9].id: round(1 / 3, 4),
+            self.recipes[10].id: round(1 / 3, 4),
+        })
+
+    def test_colliding_versions_keep_both_changes(self):
+        version = get_version("pantry")
+        cache.add(changes_key(version + 1), [self.recipes[0].id])
+        record_changes([self.recipes[1].id])
+        self.assertEqual(get_version("pantry"), version + 2)
+        self.assertEqual(
+            cache.get_many([changes_key(version + 1),
+                            changes_key(version + 2)]),
+            {
+                changes_key(version + 1): [self.recipes[0].id],
+                changes_key(version + 2): [self.recipes[1].id],
+            },
+        )
@@ -1,7 +1,10 @@
-import io
+from functools import partial
+from hashlib import md5
 
-from django.db.models import Sum
-from django.http import FileResponse
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 from rest_framework import permissions, status, viewsets
@@ -10,24 +13,48 @@ from rest_framework.permissions import (SAFE_METHODS, IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
 
+from api.cache import get_version
 from api.filters import IngredientFilter, RecipeFilter
-from api.paginations import CustomPagination
+from api.http_cache import (ConditionalGetMixin, get_versions,
+                            get_viewer_versions)
+from api.ingredient_index import ingredient_index
+from api.paginations import (CachedCountPagination, CursorPaginationMixin,
+                             CustomPagination, RecipeCursorPagination,
+                             SubscriptionCursorPagination)
+from api.pantry_index import pantry_index
 from api.permissions import AuthorOrReadOnly
+from api.response_cache import get_or_render
 from api.serializers import (FavoriteCreateDeleteSerializer,
-                             IngredientSerializer, RecipeCreateSerializer,
-                             RecipeReadSerializer,
+                             IngredientSerializer, PantryQuerySerializer,
+                             PantryRecipeSerializer, RecipeCreateSerializer,
+                             RecipeIdsSerializer, RecipeReadSerializer,
                              ShoppingCartCreateDeleteSerializer,
                              SubscribeCreateSerializer, SubscribeSerializer,
                              TagSerializer)
-from recipes.models import (AmountIngredient, Favorite, Ingredient, Recipe,
-                            ShoppingCart, Tag)
+from api.shopping_list import DEFAULT_FORMAT, FORMATS, create_file_response
+from api.signals import RELATION_VERSIONS, bump_on_commit
+from recipes.counters import refresh_related_counters
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from recipes.recommendations import (DEFAULT_LIMIT, MAX_ITEMS_PER_USER, TOP_K,
+                                     recommendation_index)
 from users.models import Subscription, User
 
 
-class UserViewSet(UserViewSet):
+class UserViewSet(CursorPaginationMixin, UserViewSet):
     queryset = User.objects.all()
     permission_classes = (IsAuthenticatedOrReadOnly,)
     pagination_class = CustomPagination
+    cursor_pagination_class = SubscriptionCursorPagination
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if (self.action in ("list", "retrieve")
+                and self.request.user.is_authenticated):
+            queryset = queryset.annotate(is_subscribed=Exists(
+                Subscription.objects.filter(
+                    user=self.request.user, author=OuterRef("pk"))
+            ))
+        return queryset
 
     def get_permissions(self):
         if self.action == "me":
@@ -41,7 +68,7 @@ class UserViewSet(UserViewSet):
     )
     def subscribe(self, request, id=None):
         serializer = SubscribeCreateSerializer(
-            data={"user": request.user.id, "author": id},
+            data={"author": id},
             context={"request": request})
         serializer.is_valid(raise_exception=True)
         serializer.save()
@@ -49,10 +76,9 @@ class UserViewSet(UserViewSet):
 
     @subscribe.mapping.delete
     def delete_subscribe(self, request, id=None):
-        subscription = Subscription.objects.filter(
-            user=request.user, author=id)
-        if subscription.exists():
-            subscription.delete()
+        deleted, _ = Subscription.objects.filter(
+            user=request.user, author=id).delete()
+        if deleted:
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response(
             {"error": "Вы не подписаны на этого пользователя"},
@@ -62,8 +88,8 @@ class UserViewSet(UserViewSet):
     @action(detail=False, methods=["get"],
             permission_classes=[permissions.IsAuthenticated])
     def subscriptions(self, request):
-        subscriptions = User.objects.filter(
-            author__user=request.user
+        subscriptions = SubscribeSerializer.annotate_queryset(
+            User.objects.filter(author__user=request.user), request
         )
         page = self.paginate_queryset(subscriptions)
         serializer = SubscribeSerializer(
@@ -72,28 +98,97 @@ class UserViewSet(UserViewSet):
         return self.get_paginated_response(serializer.data)
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class ReferenceDataViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
+    version_name = None
+    pagination_class = None
+
+    def get_etag(self, request):
+        return f"{self.version_name}-{get_version(self.version_name)}"
+
+    def get_cache_control(self, request):
+        return {"public": True, "max_age": settings.REFERENCE_DATA_MAX_AGE}
+
+
+class IngredientViewSet(ReferenceDataViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_class = IngredientFilter
-    pagination_class = None
+    version_name = "ingredients"
+
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get("name")
+        if not name:
+            return super().list(request, *args, **kwargs)
+        return self.conditional_response(
+            request, partial(self.search, request, name))
 
+    def search(self, request, name):
+        limit = settings.INGREDIENT_SEARCH_LIMIT
+        requested_limit = request.query_params.get("limit", "")
+        if requested_limit.isdigit():
+            limit = min(int(requested_limit), limit)
+        return Response(ingredient_index.search(name, limit))
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+
+class TagViewSet(ReferenceDataViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
-    pagination_class = None
+    version_name = "tags"
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
-    queryset = Recipe.objects.select_related("author").prefetch_related(
-        "tags", "ingredients")
+class RecipeViewSet(CursorPaginationMixin, ConditionalGetMixin,
+                    viewsets.ModelViewSet):
+    queryset = Recipe.objects.with_related()
     permission_classes = [AuthorOrReadOnly]
-    pagination_class = CustomPagination
+    pagination_class = CachedCountPagination
+    cursor_pagination_class = RecipeCursorPagination
+    cursor_actions = ("feed",)
     filter_backends = [DjangoFilterBackend]
     filterset_class = RecipeFilter
 
+    def get_etag(self, request):
+        pk = str(self.kwargs.get("pk", ""))
+        if self.action != "retrieve" or not pk.isdigit():
+            return None
+        recipe = Recipe.objects.with_renditions().filter(pk=pk).values(
+            "updated_at", "author_id", "favorites_count", "rendition_width",
+        ).first()
+        if recipe is None:
+            return None
+        return md5("-".join(map(str, (
+            pk,
+            recipe["updated_at"].timestamp(),
+            recipe["favorites_count"],
+            recipe["rendition_width"],
+            *get_versions(
+                ("tags",), ("ingredients",), ("user", recipe["author_id"])),
+            *get_viewer_versions(request.user),
+        ))).encode()).hexdigest()
+
+    def get_cache_control(self, request):
+        if request.user.is_authenticated:
+            return {"private": True, "no_cache": True}
+        return {"public": True, "no_cache": True}
+
+    def get_queryset(self):
+        return super().get_queryset().with_user_flags(self.request.user)
+
+    def list(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return super().list(request, *args, **kwargs)
+        render = partial(super().list, request, *args, **kwargs)
+        data, hit = get_or_render(
+            request, "recipes", lambda: render().data)
+        return Response(data, headers={"X-Cache": "HIT" if hit else "MISS"})
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action in (
+                "list", "feed", "pantry", "similar", "recommended"):
+            context["image_rendition"] = "list"
+        return context
+
     def get_serializer_class(self):
         if self.request.method in SAFE_METHODS:
             return RecipeReadSerializer
@@ -102,7 +197,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
     @staticmethod
     def create_favorite_or_shoppingcart(serializer_class, id, request):
         serializer = serializer_class(
-            data={"user": request.user.id, "recipe": id},
+            data={"recipe": id},
             context={"request": request},
         )
         serializer.is_valid(raise_exception=True)
@@ -111,17 +206,107 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     @staticmethod
     def delete_favorite_or_shoppingcart(model, id, request):
-        object = model.objects.filter(
+        deleted, _ = model.objects.filter(
             user=request.user, recipe_id=id
-        )
-        if object.exists():
-            object.delete()
+        ).delete()
+        if deleted:
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response(
             {"error": "Этого рецепта нет в списке"},
             status=status.HTTP_400_BAD_REQUEST,
         )
 
+    @staticmethod
+    def get_recipe_ids(request):
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data["recipes"]
+
+    @transaction.atomic
+    def bulk_create_favorite_or_shoppingcart(self, model, request):
+        ids = self.get_recipe_ids(request)
+        recipes = dict(Recipe.objects.filter(id__in=ids).annotate(
+            exists=Exists(model.objects.filter(
+                user=request.user, recipe=OuterRef("pk")))
+        ).values_list("id", "exists"))
+        added = [
+            model(user=request.user, recipe_id=id)
+            for id, exists in recipes.items() if not exists
+        ]
+        model.objects.bulk_create(added, ignore_conflicts=True)
+        if added:
+            refresh_related_counters(model, added)
+            bump_on_commit(RELATION_VERSIONS[model], request.user.id)
+        return Response([
+            {"id": id, "status": (
+                "not_found" if id not in recipes
+                else "exists" if recipes[id] else "added"
+            )}
+            for id in ids
+        ])
+
+    @staticmethod
+    def delete_relations(model, user, ids):
+        quote = connection.ops.quote_name
+        user_column, recipe_column = (
+            quote(model._meta.get_field(name).column)
+            for name in ("user", "recipe")
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {quote(model._meta.db_table)} "
+                f"WHERE {user_column} = %s AND {recipe_column} IN "
+                f"({', '.join(['%s'] * len(ids))}) "
+                f"RETURNING {recipe_column}",
+                [user.id, *ids],
+            )
+            return {recipe_id for recipe_id, in cursor.fetchall()}
+
+    @transaction.atomic
+    def bulk_delete_favorite_or_shoppingcart(self, model, request):
+        ids = self.get_recipe_ids(request)
+        deleted = self.delete_relations(model, request.user, ids)
+        if deleted:
+            refresh_related_counters(model, [
+                model(user=request.user, recipe_id=id) for id in deleted])
+            bump_on_commit(RELATION_VERSIONS[model], request.user.id)
+        return Response([
+            {"id": id, "status": (
+                "deleted" if id in deleted else "not_in_list"
+            )}
+            for id in ids
+        ])
+
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="favorite",
+        url_name="bulk-favorite",
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def bulk_favorite(self, request):
+        return self.bulk_create_favorite_or_shoppingcart(Favorite, request)
+
+    @bulk_favorite.mapping.delete
+    def bulk_del_favorite(self, request):
+        return self.bulk_delete_favorite_or_shoppingcart(Favorite, request)
+
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="shopping_cart",
+        url_name="bulk-shopping-cart",
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def bulk_shopping_cart(self, request):
+        return self.bulk_create_favorite_or_shoppingcart(
+            ShoppingCart, request)
+
+    @bulk_shopping_cart.mapping.delete
+    def bulk_del_shopping_cart(self, request):
+        return self.bulk_delete_favorite_or_shoppingcart(
+            ShoppingCart, request)
+
     @action(
         detail=True,
         methods=["post"],
@@ -150,28 +335,107 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return self.delete_favorite_or_shoppingcart(
             ShoppingCart, pk, request)
 
-    @action(methods=("get",), detail=False)
-    def download_shopping_cart(self, request):
-        shopping_cart = (
-            AmountIngredient.objects.select_related("recipe", "ingredient")
-            .filter(recipe__recipes_shoppingcart_related__user=request.user)
-            .values_list(
-                "ingredient__name",
-                "ingredient__measurement_unit",
-            )
-            .annotate(amount=Sum("amount"))
-            .order_by("ingredient__name")
+    @action(
+        methods=("get",),
+        detail=False,
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def feed(self, request):
+        recipes = self.filter_queryset(self.get_queryset()).filter(
+            author__in=Subscription.objects.filter(
+                user=request.user).values("author")
         )
-        return self.create_file_response(shopping_cart)
+        page = self.paginate_queryset(recipes)
+        serializer = RecipeReadSerializer(
+            page, many=True, context=self.get_serializer_context())
+        return self.get_paginated_response(serializer.data)
 
-    @staticmethod
-    def create_file_response(shopping_cart):
-        buffer = io.StringIO()
-        buffer.write(
-            "\n".join("\t".join(map(str, item)) for item in shopping_cart)
+    def get_limit(self, default=DEFAULT_LIMIT, maximum=TOP_K):
+        requested_limit = self.request.query_params.get("limit", "")
+        if requested_limit.isdigit():
+            return min(int(requested_limit), maximum)
+        return default
+
+    def get_ordered_response(self, ids):
+        recipes = self.get_queryset().in_bulk(ids)
+        serializer = RecipeReadSerializer(
+            [recipes[id] for id in ids if id in recipes],
+            many=True,
+            context=self.get_serializer_context(),
+        )
+        return Response(serializer.data)
+
+    @action(methods=("get",), detail=True)
+    def similar(self, request, pk=None):
+        recipe = get_object_or_404(Recipe.objects.only("id"), pk=pk)
+        return self.get_ordered_response([
+            id for id, _ in recommendation_index.similar(
+                recipe.id, self.get_limit())
+        ])
+
+    @action(
+        methods=("get",),
+        detail=False,
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def recommended(self, request):
+        limit = self.get_limit()
+        seeds = set()
+        for model in (Favorite, ShoppingCart):
+            seeds.update(model.objects.filter(user=request.user).order_by(
+                "-id").values_list("recipe_id", flat=True)[
+                    :MAX_ITEMS_PER_USER])
+        ids = [
+            id for id, _ in recommendation_index.recommend(seeds, limit)
+        ]
+        if len(ids) < limit:
+            ids.extend(
+                Recipe.objects.exclude(id__in=seeds.union(ids))
+                .order_by("-favorites_count", "-pub_date", "-id")
+                .values_list("id", flat=True)[:limit - len(ids)]
+            )
+        return self.get_ordered_response(ids)
+
+    @action(methods=("get",), detail=False)
+    def pantry(self, request):
+        serializer = PantryQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+        results = pantry_index.search(
+            params["ingredients"],
+            tag_ids=params.get("tags"),
+            max_cooking_time=params.get("max_cooking_time"),
+            min_coverage=params["min_coverage"],
+        )
+        paginator = CustomPagination()
+        page = paginator.paginate_queryset(results, request, view=self)
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for _, _, recipe_id in page])
+        found = []
+        for coverage, matched, recipe_id in page:
+            recipe = recipes.get(recipe_id)
+            if recipe is None:
+                continue
+            recipe.coverage = round(coverage, 4)
+            recipe.matched_ingredients = matched
+            found.append(recipe)
+        serializer = PantryRecipeSerializer(
+            found,
+            many=True,
+            context=self.get_serializer_context(),
         )
-        response = FileResponse(buffer.getvalue(), content_type="text/plain")
-        response[
-            "Content-Disposition"
-        ] = 'attachment; filename="shopping_cart.txt"'
-        return response
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(
+        methods=("get",),
+        detail=False,
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def download_shopping_cart(self, request):
+        file_format = request.query_params.get("file_format", DEFAULT_FORMAT)
+        if file_format not in FORMATS:
+            return Response(
+                {"error": "Неподдерживаемый формат файла"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return create_file_response(request.user, file_format)
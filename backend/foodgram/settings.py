@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 
 from dotenv import find_dotenv, load_dotenv
@@ -109,6 +110,48 @@ DJOSER = {
     "LOGIN_FIELD": "email",
 }
 
+CACHE_BACKEND = os.getenv(
+    "CACHE_BACKEND", "django.core.cache.backends.filebased.FileBasedCache")
+
+CULLED_CACHE_BACKENDS = (
+    "django.core.cache.backends.filebased.FileBasedCache",
+    "django.core.cache.backends.locmem.LocMemCache",
+)
+
+CACHES = {
+    "default": {
+        "BACKEND": CACHE_BACKEND,
+        "LOCATION": os.getenv(
+            "CACHE_LOCATION",
+            os.path.join(tempfile.gettempdir(), "foodgram_cache"),
+        ),
+        "OPTIONS": {
+            "MAX_ENTRIES": int(os.getenv("CACHE_MAX_ENTRIES", 10000)),
+        },
+    },
+    "versions": {
+        "BACKEND": CACHE_BACKEND,
+        "LOCATION": os.getenv(
+            "VERSION_CACHE_LOCATION",
+            os.path.join(tempfile.gettempdir(), "foodgram_versions"),
+        ),
+        "OPTIONS": {
+            "MAX_ENTRIES": int(
+                os.getenv("VERSION_CACHE_MAX_ENTRIES", 10 ** 7)),
+        },
+    },
+}
+
+if CACHE_BACKEND not in CULLED_CACHE_BACKENDS:
+    for cache_settings in CACHES.values():
+        cache_settings.pop("OPTIONS")
+
+COUNT_CACHE_TIMEOUT = int(os.getenv("COUNT_CACHE_TIMEOUT", 5 * 60))
+
+ESTIMATED_COUNT_THRESHOLD = int(os.getenv("ESTIMATED_COUNT_THRESHOLD", 10000))
+
+RESPONSE_CACHE_TIMEOUT = int(os.getenv("RESPONSE_CACHE_TIMEOUT", 5 * 60))
+
 LANGUAGE_CODE = "ru"
 
 TIME_ZONE = "Europe/Moscow"
@@ -128,3 +171,26 @@ MEDIA_URL = "/backend_media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+REFERENCE_DATA_MAX_AGE = int(os.getenv("REFERENCE_DATA_MAX_AGE", 60))
+
+INGREDIENT_SEARCH_LIMIT = int(os.getenv("INGREDIENT_SEARCH_LIMIT", 50))
+
+INDEX_MAX_AGE = int(os.getenv("INDEX_MAX_AGE", 5 * 60))
+
+IMAGE_RENDITION_WORKER = os.getenv("IMAGE_RENDITION_WORKER", "thread")
+
+IMAGE_RENDITION_THREADS = int(os.getenv("IMAGE_RENDITION_THREADS", 2))
+
+IMAGE_RENDITION_SWEEP_INTERVAL = int(
+    os.getenv("IMAGE_RENDITION_SWEEP_INTERVAL", 60))
+
+RECOMMENDATIONS_PATH = os.getenv(
+    "RECOMMENDATIONS_PATH",
+    os.path.join(BASE_DIR, "recommendations", "recommendations.bin"),
+)
+
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    "SHOPPING_LIST_PDF_FONT",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+)
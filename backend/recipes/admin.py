@@ -58,9 +58,9 @@ class RecipeAdmin(admin.ModelAdmin):
     def get_image(self, obj):
         return mark_safe(f"<img src={obj.image.url} width='80' hieght='30'")
 
-    @admin.display(description="В избранном")
+    @admin.display(description="В избранном", ordering="favorites_count")
     def count_favorites(self, obj):
-        return obj.recipes_favorite_related.count()
+        return obj.favorites_count
 
     @admin.display(description="Ингредиенты")
     def get_ingredients(self, obj):
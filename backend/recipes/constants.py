@@ -4,3 +4,4 @@ MAX_LEN_TITLE = 200
 MIN_VALUE = 1
 MAX_VALUE = 32767
 MAX_HEX = 7
+MAX_BULK_SIZE = 100
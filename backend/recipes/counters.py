@@ -0,0 +1,73 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from api.cache import bump_version
+from recipes.models import Favorite, Recipe
+from users.models import Subscription, User
+
+COUNTERS = (
+    (Recipe, "favorites_count", Favorite, "recipe"),
+    (User, "recipes_count", Recipe, "author"),
+    (User, "subscribers_count", Subscription, "author"),
+)
+COUNTER_VERSIONS = {
+    (Recipe, "favorites_count"): "popularity",
+}
+
+
+def bump_counter_version(model, field):
+    if (model, field) in COUNTER_VERSIONS:
+        transaction.on_commit(
+            partial(bump_version, COUNTER_VERSIONS[model, field]))
+
+
+def change_counter(model, field, pks, delta):
+    bump_counter_version(model, field)
+    return model.objects.filter(pk__in=pks).update(
+        **{field: Greatest(F(field) + delta, 0)})
+
+
+def change_related_counters(related_model, instances, delta):
+    for model, field, counted_model, related_field in COUNTERS:
+        if counted_model is related_model:
+            change_counter(model, field, [
+                getattr(instance, f"{related_field}_id")
+                for instance in instances
+            ], delta)
+
+
+def refresh_related_counters(related_model, instances):
+    for model, field, counted_model, related_field in COUNTERS:
+        if counted_model is related_model:
+            bump_counter_version(model, field)
+            model.objects.filter(pk__in=[
+                getattr(instance, f"{related_field}_id")
+                for instance in instances
+            ]).update(**{field: get_actual_count(
+                counted_model, related_field)})
+
+
+def get_actual_count(counted_model, related_field):
+    return Coalesce(
+        Subquery(
+            counted_model.objects.filter(**{related_field: OuterRef("pk")})
+            .order_by()
+            .values(related_field)
+            .annotate(count=Count("pk"))
+            .values("count")
+        ),
+        0,
+    )
+
+
+def reconcile_counters():
+    for model, field, counted_model, related_field in COUNTERS:
+        actual = get_actual_count(counted_model, related_field)
+        fixed = model.objects.exclude(
+            **{field: actual}).update(**{field: actual})
+        if fixed:
+            bump_counter_version(model, field)
+        yield model, field, fixed
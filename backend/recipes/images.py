@@ -0,0 +1,67 @@
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+RENDITIONS_DIR = "recipes/renditions"
+RENDITION_SIZES = {
+    "short": 240,
+    "list": 480,
+    "detail": 960,
+}
+RENDITION_FORMATS = {
+    "jpg": ("JPEG", {"quality": 85, "optimize": True}),
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+}
+DEFAULT_FORMAT = "jpg"
+
+
+def rendition_name(image_name, size, extension=DEFAULT_FORMAT):
+    stem = PurePosixPath(image_name).stem
+    return f"{RENDITIONS_DIR}/{stem}_{size}.{extension}"
+
+
+def rendition_url(image_name, size, extension=DEFAULT_FORMAT):
+    return default_storage.url(rendition_name(image_name, size, extension))
+
+
+def rendition_candidates(image_name, width, extension=DEFAULT_FORMAT):
+    candidates = {}
+    for size, max_width in RENDITION_SIZES.items():
+        candidates.setdefault(min(max_width, width), size)
+    return [
+        (rendition_url(image_name, size, extension), candidate_width)
+        for candidate_width, size in sorted(candidates.items())
+    ]
+
+
+def render(image, max_width, image_format, options):
+    rendition = image.copy()
+    rendition.thumbnail((max_width, image.height), Image.LANCZOS)
+    buffer = BytesIO()
+    rendition.save(buffer, image_format, **options)
+    return ContentFile(buffer.getvalue())
+
+
+def create_renditions(image_name):
+    with default_storage.open(image_name) as image_file:
+        with Image.open(image_file) as original:
+            image = ImageOps.exif_transpose(original)
+            if image.mode != "RGB":
+                image = image.convert("RGB")
+    for size, max_width in RENDITION_SIZES.items():
+        for extension, (image_format, options) in RENDITION_FORMATS.items():
+            name = rendition_name(image_name, size, extension)
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            default_storage.save(
+                name, render(image, max_width, image_format, options))
+    return image.width
+
+
+def delete_renditions(image_name):
+    for size in RENDITION_SIZES:
+        for extension in RENDITION_FORMATS:
+            default_storage.delete(rendition_name(image_name, size, extension))
@@ -0,0 +1,308 @@
+import csv
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from itertools import chain
+
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.db import connection, transaction
+
+from recipes.models import AmountIngredient, Ingredient, Recipe, Tag
+from users.models import User
+
+CHUNK_SIZE = 64 * 1024
+BATCH_SIZE = 1000
+WORKERS = 4
+
+NATURAL_KEYS = {
+    Ingredient: ("name", "measurement_unit"),
+    Tag: ("slug",),
+    User: ("email",),
+    Recipe: ("author", "name"),
+    AmountIngredient: ("recipe", "ingredient"),
+}
+
+
+def read_json(data_file, model):
+    decoder = json.JSONDecoder()
+    buffer = data_file.read(CHUNK_SIZE).lstrip()
+    if not buffer.startswith("["):
+        raise ValueError("Ожидается JSON-массив объектов")
+    position = 1
+    while True:
+        while position < len(buffer) and buffer[position] in " \t\r\n,":
+            position += 1
+        if position < len(buffer) and buffer[position] == "]":
+            return
+        try:
+            item, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            chunk = data_file.read(CHUNK_SIZE)
+            if not chunk:
+                raise
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        yield item
+
+
+def read_csv(data_file, model):
+    fields = [
+        field.name for field in model._meta.concrete_fields
+        if not field.primary_key
+    ]
+    reader = csv.reader(data_file)
+    for row in reader:
+        if row == fields:
+            continue
+        yield dict(zip(fields, row))
+
+
+READERS = {
+    ".json": read_json,
+    ".csv": read_csv,
+}
+
+
+def read_files(paths, model):
+    for path in paths:
+        reader = READERS[path.suffix.lower()]
+        with open(path, encoding="utf-8", newline="") as data_file:
+            yield from reader(data_file, model)
+
+
+@lru_cache(maxsize=None)
+def hash_password(password):
+    try:
+        identify_hasher(password)
+    except ValueError:
+        return make_password(password)
+    return password
+
+
+def get_dependencies(model):
+    return {
+        field.related_model
+        for field in model._meta.get_fields()
+        if field.is_relation and not field.auto_created
+        and field.related_model is not model
+    }
+
+
+def get_levels(models):
+    pending = {
+        model: get_dependencies(model) & set(models) for model in models
+    }
+    levels = []
+    while pending:
+        level = [model for model, deps in pending.items() if not deps]
+        if not level:
+            raise ValueError(
+                "Циклическая зависимость между моделями: "
+                + ", ".join(model.__name__ for model in pending)
+            )
+        for model in level:
+            del pending[model]
+        for deps in pending.values():
+            deps.difference_update(level)
+        levels.append(level)
+    return levels
+
+
+def get_unique_keys(model):
+    keys = [
+        (field.attname,) for field in model._meta.concrete_fields
+        if field.unique and not field.primary_key
+    ]
+    keys.extend(
+        tuple(
+            model._meta.get_field(name).attname
+            for name in constraint.fields
+        )
+        for constraint in model._meta.total_unique_constraints
+    )
+    return keys
+
+
+def deduplicate(rows, model):
+    keys = get_unique_keys(model)
+    seen = {key: set() for key in keys}
+    for values, relations in rows:
+        key_values = {
+            key: tuple(values.get(field) for field in key) for key in keys
+        }
+        if any(key_values[key] in seen[key] for key in keys):
+            continue
+        for key in keys:
+            seen[key].add(key_values[key])
+        yield values, relations
+
+
+class IdResolver:
+    def __init__(self):
+        self.id_maps = {}
+
+    def get_key_fields(self, model):
+        if model not in NATURAL_KEYS:
+            raise ValueError(
+                f"Для модели {model.__name__} ссылки задаются только по id")
+        return [model._meta.get_field(name) for name in NATURAL_KEYS[model]]
+
+    def get_referenced_models(self, model, seen=None):
+        seen = set() if seen is None else seen
+        for related_model in get_dependencies(model):
+            if related_model in seen or related_model not in NATURAL_KEYS:
+                continue
+            seen.add(related_model)
+            self.get_referenced_models(related_model, seen)
+        return seen
+
+    def preload(self, models):
+        for model in models:
+            attnames = [field.attname for field in self.get_key_fields(model)]
+            self.id_maps[model] = {
+                tuple(key): pk
+                for pk, *key in model.objects.values_list(
+                    "pk", *attnames).iterator()
+            }
+
+    def skip_existing(self, model, rows):
+        if model not in NATURAL_KEYS:
+            yield from rows
+            return
+        key_fields = self.get_key_fields(model)
+        seen = set(self.id_maps.get(model, ()))
+        for values, relations in rows:
+            key = tuple(
+                field.to_python(values.get(field.attname))
+                for field in key_fields
+            )
+            if key in seen:
+                continue
+            seen.add(key)
+            yield values, relations
+
+    def resolve(self, model, value):
+        if isinstance(value, int):
+            return value
+        key_fields = self.get_key_fields(model)
+        if isinstance(value, dict):
+            value = [value[field.name] for field in key_fields]
+        elif not isinstance(value, (list, tuple)):
+            value = [value]
+        key = tuple(
+            self.resolve(field.related_model, item) if field.is_relation
+            else item
+            for field, item in zip(key_fields, value)
+        )
+        try:
+            return self.id_maps[model][key]
+        except KeyError:
+            raise ValueError(f"{model.__name__} {list(value)} не найден")
+
+    def prepare(self, model, row):
+        values, relations = {}, {}
+        for name, value in row.items():
+            field = model._meta.get_field(name)
+            if field.many_to_many:
+                relations[field] = [
+                    self.resolve(field.related_model, item) for item in value
+                ]
+            elif field.is_relation and name != field.attname:
+                values[field.attname] = self.resolve(
+                    field.related_model, value)
+            elif name == "password" and model is User:
+                values[name] = hash_password(value)
+            else:
+                values[field.attname] = value
+        return values, relations
+
+
+def create_relations(batch, batch_size):
+    through_objects = {}
+    for instance, relations in batch:
+        for field, related_ids in relations.items():
+            through = field.remote_field.through
+            if not through._meta.auto_created:
+                raise ValueError(
+                    f"Связь {field.name} загружается через модель "
+                    f"{through.__name__}"
+                )
+            source = f"{field.m2m_field_name()}_id"
+            target = f"{field.m2m_reverse_field_name()}_id"
+            through_objects.setdefault(through, []).extend(
+                through(**{source: instance.pk, target: related_id})
+                for related_id in related_ids
+            )
+    for through, objects in through_objects.items():
+        through.objects.bulk_create(
+            objects, ignore_conflicts=True, batch_size=batch_size)
+
+
+def save_batch(model, batch, batch_size):
+    has_relations = any(relations for _, relations in batch)
+    model.objects.bulk_create(
+        [instance for instance, _ in batch],
+        ignore_conflicts=not has_relations,
+        batch_size=batch_size,
+    )
+    if has_relations:
+        create_relations(batch, batch_size)
+
+
+def bulk_load(model, paths, resolver, batch_size=BATCH_SIZE):
+    started = time.monotonic()
+    total = 0
+    batch = []
+    rows = (resolver.prepare(model, row) for row in read_files(paths, model))
+    rows = resolver.skip_existing(model, deduplicate(rows, model))
+    with transaction.atomic():
+        for values, relations in rows:
+            batch.append((model(**values), relations))
+            if len(batch) >= batch_size:
+                save_batch(model, batch, batch_size)
+                total += len(batch)
+                batch = []
+        if batch:
+            save_batch(model, batch, batch_size)
+            total += len(batch)
+    return model, total, time.monotonic() - started
+
+
+def bulk_load_in_thread(*args):
+    try:
+        return bulk_load(*args)
+    finally:
+        connection.close()
+
+
+class ImportPipeline:
+    def __init__(self, sources, batch_size=BATCH_SIZE, workers=WORKERS):
+        self.sources = sources
+        self.batch_size = batch_size
+        self.workers = workers
+        if connection.vendor == "sqlite":
+            self.workers = 1
+        self.resolver = IdResolver()
+
+    def load_level(self, level):
+        args = [
+            (model, self.sources[model], self.resolver, self.batch_size)
+            for model in level
+        ]
+        if self.workers == 1:
+            return [bulk_load(*model_args) for model_args in args]
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            return list(executor.map(
+                lambda model_args: bulk_load_in_thread(*model_args), args))
+
+    def run(self):
+        for level in get_levels(list(self.sources)):
+            referenced = set(chain.from_iterable(
+                self.resolver.get_referenced_models(model) for model in level
+            ))
+            referenced.update(
+                model for model in level if model in NATURAL_KEYS)
+            self.resolver.preload(referenced)
+            yield from self.load_level(level)
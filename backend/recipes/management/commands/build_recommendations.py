@@ -0,0 +1,54 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from recipes.recommendations import (MAX_ITEMS_PER_USER, TOP_K, CoOccurrence,
+                                     recommendation_index)
+
+
+class Command(BaseCommand):
+    help = "Построить рекомендации рецептов по избранному и спискам покупок"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help=(
+                "Пересчитать с нуля вместо дообновления по новым записям. "
+                "Если записи удалялись, пересчёт с нуля выполняется сам"
+            ),
+        )
+        parser.add_argument(
+            "--top-k",
+            type=int,
+            default=TOP_K,
+            help="Количество похожих рецептов для каждого рецепта",
+        )
+        parser.add_argument(
+            "--max-items-per-user",
+            type=int,
+            default=MAX_ITEMS_PER_USER,
+            help="Максимум рецептов одного пользователя",
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        co_occurrence = None
+        added = None
+        if not options["full"]:
+            co_occurrence = recommendation_index.get_co_occurrence()
+        if co_occurrence is not None:
+            added = co_occurrence.refresh(options["max_items_per_user"])
+        if added is None:
+            co_occurrence = CoOccurrence()
+            co_occurrence.build(options["max_items_per_user"])
+            self.stdout.write("Полный пересчёт")
+        else:
+            self.stdout.write(f"Новых записей учтено: {added}")
+        items = co_occurrence.save(
+            settings.RECOMMENDATIONS_PATH, options["top_k"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Рецептов в индексе: {items} "
+            f"за {time.monotonic() - started:.2f} с"
+        ))
@@ -1,12 +1,31 @@
 import json
+from pathlib import Path
 
 from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
 from django.core.management.base import BaseCommand, CommandError
 
+from api.cache import bump_version
+from recipes.counters import reconcile_counters
+from recipes.loaders import BATCH_SIZE, READERS, WORKERS, ImportPipeline
 from recipes.models import (AmountIngredient, Favorite, Ingredient, Recipe,
                             ShoppingCart, Tag)
+from recipes.search import rebuild as rebuild_search_index
 from users.models import Subscription, User
 
+VERSIONS = {
+    Ingredient: ("ingredients", "catalog"),
+    Tag: ("tags", "catalog"),
+    Recipe: ("catalog", "pantry"),
+    AmountIngredient: ("catalog", "pantry"),
+    User: ("catalog",),
+}
+USER_VERSIONS = {
+    Favorite: "favorites",
+    ShoppingCart: "cart",
+    Subscription: "subscriptions",
+}
+
 
 class Command(BaseCommand):
     help = "Загрузить данные в модели ингредиентов и тегов"
@@ -28,6 +47,23 @@ class Command(BaseCommand):
             default=["Ingredient", "Tag"],
             help="Модели для загрузки данных",
         )
+        parser.add_argument(
+            "--bulk",
+            action="store_true",
+            help="Потоковая загрузка пачками через bulk_create",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=BATCH_SIZE,
+            help="Размер пачки для bulk_create",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=WORKERS,
+            help="Количество потоков для независимых моделей",
+        )
 
     def load_data(self, file_name, model):
         with open(
@@ -37,6 +73,37 @@ class Command(BaseCommand):
             for item in data:
                 model.objects.get_or_create(**item)
 
+    def bulk_load_data(self, sources, batch_size, workers):
+        pipeline = ImportPipeline(sources, batch_size, workers)
+        try:
+            for model, total, elapsed in pipeline.run():
+                rate = total / elapsed if elapsed else total
+                self.stdout.write(
+                    f"{model.__name__}: {total} строк "
+                    f"за {elapsed:.2f} с ({rate:.0f} строк/с)"
+                )
+        except (FieldDoesNotExist, LookupError, ValueError) as error:
+            raise CommandError(f"Ошибка загрузки: {error}")
+        for model, field, fixed in reconcile_counters():
+            if fixed:
+                self.stdout.write(
+                    f"{model.__name__}.{field}: пересчитано {fixed}")
+        if Recipe in sources or Ingredient in sources:
+            rebuild_search_index()
+        self.bump_versions(sources)
+
+    def bump_versions(self, models):
+        names = {
+            name for model in models for name in VERSIONS.get(model, ())
+        }
+        for name in names:
+            bump_version(name)
+        for model in models:
+            if model in USER_VERSIONS:
+                for user_id in model.objects.values_list(
+                        "user_id", flat=True).order_by().distinct().iterator():
+                    bump_version(USER_VERSIONS[model], user_id)
+
     def handle(self, *args, **kwargs):
         self.stdout.write(self.style.WARNING("Начало загрузки"))
         files = kwargs["files"]
@@ -55,9 +122,20 @@ class Command(BaseCommand):
             "User": User,
             "Subscription": Subscription,
         }
+        sources = {}
         for file_name, model_name in zip(files, models):
             model = model_dict.get(model_name)
             if not model:
                 raise CommandError(f"Модель {model_name} не найдена")
-            self.load_data(file_name, model)
+            if not kwargs["bulk"]:
+                self.load_data(file_name, model)
+                continue
+            path = Path(settings.BASE_DIR, "data", file_name)
+            if path.suffix.lower() not in READERS:
+                raise CommandError(
+                    f"Неподдерживаемый формат файла {file_name}")
+            sources.setdefault(model, []).append(path)
+        if sources:
+            self.bulk_load_data(
+                sources, kwargs["batch_size"], kwargs["workers"])
         self.stdout.write(self.style.SUCCESS("Загрузка завершена"))
@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.renditions import enqueue_missing, process_pending
+
+
+class Command(BaseCommand):
+    help = "Создать уменьшенные версии изображений рецептов из очереди"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Обработать очередь один раз и завершиться",
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=None,
+            help="Максимум изображений за один проход",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=5,
+            help="Пауза между проходами в секундах",
+        )
+        parser.add_argument(
+            "--enqueue-missing",
+            action="store_true",
+            help="Поставить в очередь изображения без версий",
+        )
+
+    def handle(self, *args, **options):
+        if options["enqueue_missing"]:
+            self.stdout.write(
+                f"Добавлено в очередь: {enqueue_missing()}")
+        while True:
+            processed = process_pending(options["limit"])
+            if processed:
+                self.stdout.write(f"Обработано изображений: {processed}")
+            if options["once"]:
+                return
+            if not processed:
+                time.sleep(options["sleep"])
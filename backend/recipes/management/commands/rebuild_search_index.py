@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.search import is_supported, rebuild
+
+
+class Command(BaseCommand):
+    help = "Перестроить полнотекстовый индекс рецептов"
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        if not is_supported():
+            self.stdout.write(self.style.WARNING(
+                "Полнотекстовый поиск не поддерживается этой базой данных"))
+            return
+        rebuild()
+        self.stdout.write(self.style.SUCCESS("Индекс перестроен"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = "Пересчитать счётчики избранного, рецептов и подписчиков"
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        for model, field, fixed in reconcile_counters():
+            self.stdout.write(
+                f"{model.__name__}.{field}: исправлено записей {fixed}")
@@ -0,0 +1,35 @@
+from django.db import migrations
+
+INDEX_NAME = "ingredient_name_prefix_idx"
+INDEX_SQL = {
+    "postgresql": (
+        f"CREATE INDEX IF NOT EXISTS {INDEX_NAME} ON recipes_ingredient "
+        "(UPPER(name) text_pattern_ops)"
+    ),
+    "sqlite": (
+        f"CREATE INDEX IF NOT EXISTS {INDEX_NAME} ON recipes_ingredient "
+        "(name COLLATE NOCASE)"
+    ),
+}
+
+
+def create_index(apps, schema_editor):
+    sql = INDEX_SQL.get(schema_editor.connection.vendor)
+    if sql:
+        schema_editor.execute(sql)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor in INDEX_SQL:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {INDEX_NAME}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_alter_favorite_recipe_alter_recipe_author_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.5 on 2026-10-18 05:15
+
+from django.db import migrations, models
+
+
+def enqueue_existing_images(apps, schema_editor):
+    Recipe = apps.get_model("recipes", "Recipe")
+    ImageRendition = apps.get_model("recipes", "ImageRendition")
+    images = Recipe.objects.exclude(image="").values_list(
+        "image", flat=True).distinct()
+    ImageRendition.objects.bulk_create(
+        [ImageRendition(image=image) for image in images.iterator()],
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_recipe_pub_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageRendition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('image', models.CharField(max_length=200, unique=True, verbose_name='Изображение')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('processing', 'Обрабатывается'), ('done', 'Готово'), ('failed', 'Ошибка')], default='pending', max_length=16, verbose_name='Статус')),
+                ('width', models.PositiveIntegerField(blank=True, null=True, verbose_name='Ширина оригинала')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Попытки')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата изменения')),
+            ],
+            options={
+                'verbose_name': 'Версии изображения',
+                'verbose_name_plural': 'Версии изображений',
+                'indexes': [models.Index(fields=['status', 'updated_at'], name='rendition_status_idx')],
+            },
+        ),
+        migrations.RunPython(
+            enqueue_existing_images, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 4.2.5 on 2026-10-18 05:20
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+COUNTERS = (
+    ("recipes", "Recipe", "favorites_count", "recipes", "Favorite", "recipe"),
+    ("users", "User", "recipes_count", "recipes", "Recipe", "author"),
+    ("users", "User", "subscribers_count",
+     "users", "Subscription", "author"),
+)
+
+
+def fill_counters(apps, schema_editor):
+    for (app_label, model_name, field,
+         counted_app_label, counted_model_name, related_field) in COUNTERS:
+        model = apps.get_model(app_label, model_name)
+        counted_model = apps.get_model(counted_app_label, counted_model_name)
+        model.objects.update(**{field: Coalesce(
+            Subquery(
+                counted_model.objects.filter(
+                    **{related_field: OuterRef("pk")})
+                .order_by()
+                .values(related_field)
+                .annotate(count=Count("pk"))
+                .values("count")
+            ),
+            0,
+        )})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0014_imagerendition'),
+        ('users', '0005_user_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-favorites_count', '-pub_date', '-id'], name='recipe_popularity_idx'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
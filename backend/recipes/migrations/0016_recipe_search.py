@@ -0,0 +1,62 @@
+from django.db import migrations
+
+SEARCH_TABLE = "recipes_recipe_search"
+CREATE_SQL = {
+    "postgresql": (
+        f"CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} ("
+        "recipe_id bigint PRIMARY KEY, document tsvector NOT NULL)",
+        f"CREATE INDEX IF NOT EXISTS {SEARCH_TABLE}_document_idx "
+        f"ON {SEARCH_TABLE} USING GIN (document)",
+    ),
+    "sqlite": (
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+        "name, ingredients, text, "
+        "tokenize = 'unicode61 remove_diacritics 2')",
+    ),
+}
+FILL_SQL = {
+    "postgresql": (
+        f"INSERT INTO {SEARCH_TABLE} (recipe_id, document) "
+        "SELECT r.id, "
+        "setweight(to_tsvector('russian', r.name), 'A') || "
+        "setweight(to_tsvector('russian', coalesce(("
+        "SELECT string_agg(i.name, ' ') FROM recipes_amountingredient a "
+        "JOIN recipes_ingredient i ON i.id = a.ingredient_id "
+        "WHERE a.recipe_id = r.id), '')), 'B') || "
+        "setweight(to_tsvector('russian', r.text), 'C') "
+        "FROM recipes_recipe r ON CONFLICT (recipe_id) DO NOTHING"
+    ),
+    "sqlite": (
+        f"INSERT INTO {SEARCH_TABLE} (rowid, name, ingredients, text) "
+        "SELECT r.id, r.name, coalesce(("
+        "SELECT group_concat(i.name, ' ') FROM recipes_amountingredient a "
+        "JOIN recipes_ingredient i ON i.id = a.ingredient_id "
+        "WHERE a.recipe_id = r.id), ''), r.text "
+        "FROM recipes_recipe r"
+    ),
+}
+
+
+def create_search_table(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor not in CREATE_SQL:
+        return
+    for sql in CREATE_SQL[vendor]:
+        schema_editor.execute(sql)
+    schema_editor.execute(FILL_SQL[vendor])
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor in CREATE_SQL:
+        schema_editor.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0015_recipe_favorites_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
@@ -70,6 +70,42 @@ class Tag(models.Model):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+    def with_renditions(self):
+        return self.annotate(
+            rendition_width=models.Subquery(
+                ImageRendition.objects.filter(
+                    image=models.OuterRef("image"),
+                    status=ImageRendition.DONE,
+                ).values("width")[:1]
+            ),
+        )
+
+    def with_related(self):
+        return self.with_renditions().select_related(
+            "author"
+        ).prefetch_related(
+            "tags",
+            models.Prefetch(
+                "recipe_ingredient",
+                queryset=AmountIngredient.objects.select_related("ingredient"),
+            ),
+        )
+
+    def with_user_flags(self, user):
+        if not user.is_authenticated:
+            return self.annotate(
+                is_favorited=models.Value(False),
+                is_in_shopping_cart=models.Value(False),
+            )
+        return self.annotate(
+            is_favorited=models.Exists(Favorite.objects.filter(
+                user=user, recipe=models.OuterRef("pk"))),
+            is_in_shopping_cart=models.Exists(ShoppingCart.objects.filter(
+                user=user, recipe=models.OuterRef("pk"))),
+        )
+
+
 class Recipe(models.Model):
     NAME_HELP_TEXT = "Введите название рецепта"
     AUTHOR_HELP_TEXT = "Выберите автора рецепта"
@@ -99,12 +135,17 @@ class Recipe(models.Model):
         related_name="recipes",
         verbose_name="Автор рецепта",
         help_text=AUTHOR_HELP_TEXT,
+        db_index=False,
     )
     pub_date = models.DateTimeField(
         verbose_name="Дата публикации",
         auto_now_add=True,
         editable=False,
     )
+    updated_at = models.DateTimeField(
+        verbose_name="Дата изменения",
+        auto_now=True,
+    )
     cooking_time = models.PositiveSmallIntegerField(
         "Время приготовления",
         validators=[
@@ -129,11 +170,32 @@ class Recipe(models.Model):
         through="AmountIngredient",
         help_text=INGREDIENTS_HELP_TEXT,
     )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name="В избранном",
+        default=0,
+        editable=False,
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         verbose_name = "Рецепт"
         verbose_name_plural = "Рецепты"
         ordering = ("-pub_date",)
+        indexes = (
+            models.Index(
+                fields=("author", "-pub_date"),
+                name="recipe_author_pub_date_idx",
+            ),
+            models.Index(
+                fields=("-favorites_count", "-pub_date", "-id"),
+                name="recipe_popularity_idx",
+            ),
+            models.Index(
+                fields=("-pub_date", "-id"),
+                name="recipe_pub_date_id_idx",
+            ),
+        )
         constraints = (
             models.CheckConstraint(
                 check=models.Q(name__length__gt=0),
@@ -144,6 +206,12 @@ class Recipe(models.Model):
     def __str__(self) -> str:
         return f"{self.name}. Автор: {self.author.username}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.loaded_image = instance.__dict__.get("image")
+        return instance
+
 
 class AmountIngredient(models.Model):
     INGREDIENT_RECIPE_HELP_TEXT = (
@@ -204,10 +272,17 @@ class UserRecipeRelation(models.Model):
         verbose_name="Рецепт",
         on_delete=models.CASCADE,
         related_name="%(app_label)s_%(class)s_related",
+        db_index=False,
     )
 
     class Meta:
         abstract = True
+        indexes = (
+            models.Index(
+                fields=("recipe", "user"),
+                name="%(class)s_recipe_user_idx",
+            ),
+        )
         constraints = (
             models.UniqueConstraint(
                 fields=("user", "recipe"),
@@ -239,3 +314,53 @@ class ShoppingCart(UserRecipeRelation):
 
     def __str__(self):
         return f"{self.recipe} в корзине у {self.user}"
+
+
+class ImageRendition(models.Model):
+    PENDING = "pending"
+    PROCESSING = "processing"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = (
+        (PENDING, "В очереди"),
+        (PROCESSING, "Обрабатывается"),
+        (DONE, "Готово"),
+        (FAILED, "Ошибка"),
+    )
+    image = models.CharField(
+        verbose_name="Изображение",
+        max_length=MAX_LEN_TITLE,
+        unique=True,
+    )
+    status = models.CharField(
+        verbose_name="Статус",
+        max_length=16,
+        choices=STATUS_CHOICES,
+        default=PENDING,
+    )
+    width = models.PositiveIntegerField(
+        verbose_name="Ширина оригинала",
+        null=True,
+        blank=True,
+    )
+    attempts = models.PositiveSmallIntegerField(
+        verbose_name="Попытки",
+        default=0,
+    )
+    updated_at = models.DateTimeField(
+        verbose_name="Дата изменения",
+        auto_now=True,
+    )
+
+    class Meta:
+        verbose_name = "Версии изображения"
+        verbose_name_plural = "Версии изображений"
+        indexes = (
+            models.Index(
+                fields=("status", "updated_at"),
+                name="rendition_status_idx",
+            ),
+        )
+
+    def __str__(self):
+        return f"{self.image}: {self.get_status_display()}"
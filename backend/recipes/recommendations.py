@@ -0,0 +1,285 @@
+import heapq
+import logging
+import math
+import mmap
+import os
+import struct
+import tempfile
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from itertools import combinations
+from threading import Lock
+
+from django.conf import settings
+from django.db.models import Max
+
+from recipes.models import Favorite, ShoppingCart
+
+MAGIC = b"FGRECS02"
+SOURCES = (Favorite, ShoppingCart)
+HEADER = struct.Struct("<8sQQQ" + "QQ" * len(SOURCES))
+TOP_K = 50
+DEFAULT_LIMIT = 10
+MAX_ITEMS_PER_USER = 200
+
+logger = logging.getLogger(__name__)
+
+
+def get_baskets(queries):
+    baskets = defaultdict(set)
+    for queryset in queries:
+        for user_id, recipe_id in queryset.values_list(
+                "user_id", "recipe_id").iterator():
+            baskets[user_id].add(recipe_id)
+    return baskets
+
+
+def get_last_ids():
+    return [
+        model.objects.aggregate(last_id=Max("id"))["last_id"] or 0
+        for model in SOURCES
+    ]
+
+
+def get_row_counts(last_ids):
+    return [
+        model.objects.filter(id__lte=last_id).count()
+        for model, last_id in zip(SOURCES, last_ids)
+    ]
+
+
+def cap(items, max_items):
+    return set(sorted(items, reverse=True)[:max_items])
+
+
+class CoOccurrence:
+    def __init__(self, counts=None, item_counts=None, last_ids=None,
+                 row_counts=None):
+        self.counts = counts or defaultdict(Counter)
+        self.item_counts = item_counts or Counter()
+        self.last_ids = last_ids or [0] * len(SOURCES)
+        self.row_counts = row_counts or [0] * len(SOURCES)
+
+    def change(self, items, delta, others=()):
+        for recipe_id in items:
+            self.item_counts[recipe_id] += delta
+            for other_id in others:
+                self.counts[recipe_id][other_id] += delta
+                self.counts[other_id][recipe_id] += delta
+        for recipe_id, other_id in combinations(items, 2):
+            self.counts[recipe_id][other_id] += delta
+            self.counts[other_id][recipe_id] += delta
+
+    def replace_basket(self, old, new):
+        kept = old & new
+        self.change(old - new, -1, kept)
+        self.change(new - old, 1, kept)
+
+    def build(self, max_items=MAX_ITEMS_PER_USER):
+        self.last_ids = get_last_ids()
+        self.row_counts = get_row_counts(self.last_ids)
+        baskets = get_baskets(
+            model.objects.filter(id__lte=last_id)
+            for model, last_id in zip(SOURCES, self.last_ids)
+        )
+        for items in baskets.values():
+            self.change(cap(items, max_items), 1)
+
+    def refresh(self, max_items=MAX_ITEMS_PER_USER):
+        if get_row_counts(self.last_ids) != self.row_counts:
+            return None
+        last_ids = get_last_ids()
+        new_baskets = get_baskets(
+            model.objects.filter(id__gt=old_id, id__lte=last_id)
+            for model, old_id, last_id in zip(
+                SOURCES, self.last_ids, last_ids)
+        )
+        old_baskets = get_baskets(
+            model.objects.filter(user_id__in=new_baskets, id__lte=old_id)
+            for model, old_id in zip(SOURCES, self.last_ids)
+        )
+        added = 0
+        for user_id, items in new_baskets.items():
+            old = old_baskets[user_id]
+            added += len(items - old)
+            self.replace_basket(
+                cap(old, max_items), cap(old | items, max_items))
+        self.prune()
+        self.last_ids = last_ids
+        self.row_counts = get_row_counts(last_ids)
+        return added
+
+    def prune(self):
+        for recipe_id, row in list(self.counts.items()):
+            for other_id in [
+                other_id for other_id, count in row.items() if count <= 0
+            ]:
+                del row[other_id]
+            if not row:
+                del self.counts[recipe_id]
+        for recipe_id in [
+            recipe_id for recipe_id, count in self.item_counts.items()
+            if count <= 0
+        ]:
+            del self.item_counts[recipe_id]
+
+    def get_top(self, recipe_id, top_k):
+        count = self.item_counts[recipe_id]
+        return heapq.nlargest(top_k, (
+            (together / math.sqrt(count * self.item_counts[other_id]),
+             other_id)
+            for other_id, together in self.counts[recipe_id].items()
+            if count and self.item_counts[other_id]
+        ))
+
+    def save(self, path, top_k=TOP_K):
+        items = sorted(set(self.item_counts) | set(self.counts))
+        sections = {
+            name: array(code) for name, code in (
+                ("item_counts", "q"), ("count_offsets", "q"),
+                ("count_neighbors", "q"), ("count_values", "q"),
+                ("top_offsets", "q"), ("top_neighbors", "q"),
+                ("top_scores", "f"),
+            )
+        }
+        sections["count_offsets"].append(0)
+        sections["top_offsets"].append(0)
+        for recipe_id in items:
+            sections["item_counts"].append(self.item_counts[recipe_id])
+            row = sorted(self.counts[recipe_id].items())
+            sections["count_neighbors"].extend(
+                other_id for other_id, _ in row)
+            sections["count_values"].extend(count for _, count in row)
+            sections["count_offsets"].append(
+                len(sections["count_neighbors"]))
+            for score, other_id in self.get_top(recipe_id, top_k):
+                sections["top_neighbors"].append(other_id)
+                sections["top_scores"].append(score)
+            sections["top_offsets"].append(len(sections["top_neighbors"]))
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+                dir=directory, delete=False) as data_file:
+            data_file.write(HEADER.pack(
+                MAGIC,
+                len(items),
+                len(sections["count_neighbors"]),
+                len(sections["top_neighbors"]),
+                *self.last_ids,
+                *self.row_counts,
+            ))
+            array("q", items).tofile(data_file)
+            for values in sections.values():
+                values.tofile(data_file)
+        os.replace(data_file.name, path)
+        return len(items)
+
+
+class RecommendationIndex:
+    def __init__(self, path=None):
+        self.path = path
+        self.lock = Lock()
+        self.stamp = None
+        self.data = None
+        self.sections = None
+
+    def get_path(self):
+        return self.path or settings.RECOMMENDATIONS_PATH
+
+    def load(self, path):
+        with open(path, "rb") as data_file:
+            data = mmap.mmap(data_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, items, pairs, top, *ids = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError(f"Неверный формат файла {path}")
+        view = memoryview(data)
+        position = HEADER.size
+        sections = {
+            "last_ids": ids[:len(SOURCES)],
+            "row_counts": ids[len(SOURCES):],
+        }
+        for name, code, size in (
+            ("items", "q", items), ("item_counts", "q", items),
+            ("count_offsets", "q", items + 1),
+            ("count_neighbors", "q", pairs), ("count_values", "q", pairs),
+            ("top_offsets", "q", items + 1), ("top_neighbors", "q", top),
+            ("top_scores", "f", top),
+        ):
+            end = position + size * struct.calcsize(code)
+            sections[name] = view[position:end].cast(code)
+            position = end
+        self.data = data
+        self.sections = sections
+
+    def ensure_loaded(self):
+        path = self.get_path()
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self.stamp = self.sections = None
+            return None
+        stamp = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if self.stamp != stamp:
+            with self.lock:
+                if self.stamp != stamp:
+                    try:
+                        self.load(path)
+                    except (ValueError, struct.error):
+                        logger.exception(
+                            "Не удалось прочитать рекомендации %s", path)
+                        self.sections = None
+                    self.stamp = stamp
+        return self.sections
+
+    def find(self, sections, recipe_id):
+        position = bisect_left(sections["items"], recipe_id)
+        if (position < len(sections["items"])
+                and sections["items"][position] == recipe_id):
+            return position
+        return None
+
+    def similar(self, recipe_id, limit=TOP_K):
+        sections = self.ensure_loaded()
+        if sections is None:
+            return []
+        position = self.find(sections, recipe_id)
+        if position is None:
+            return []
+        start = sections["top_offsets"][position]
+        end = min(
+            sections["top_offsets"][position + 1], start + limit)
+        return list(zip(
+            sections["top_neighbors"][start:end].tolist(),
+            sections["top_scores"][start:end].tolist(),
+        ))
+
+    def recommend(self, recipe_ids, limit=TOP_K):
+        seeds = set(recipe_ids)
+        scores = Counter()
+        for recipe_id in seeds:
+            for other_id, score in self.similar(recipe_id):
+                if other_id not in seeds:
+                    scores[other_id] += score
+        return scores.most_common(limit)
+
+    def get_co_occurrence(self):
+        sections = self.ensure_loaded()
+        if sections is None:
+            return None
+        counts = defaultdict(Counter)
+        item_counts = Counter()
+        for position, recipe_id in enumerate(sections["items"]):
+            item_counts[recipe_id] = sections["item_counts"][position]
+            start = sections["count_offsets"][position]
+            end = sections["count_offsets"][position + 1]
+            counts[recipe_id].update(dict(zip(
+                sections["count_neighbors"][start:end].tolist(),
+                sections["count_values"][start:end].tolist(),
+            )))
+        return CoOccurrence(
+            counts, item_counts, list(sections["last_ids"]),
+            list(sections["row_counts"]))
+
+
+recommendation_index = RecommendationIndex()
@@ -0,0 +1,144 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from threading import Lock, Thread
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from recipes.images import create_renditions, delete_renditions
+from recipes.models import ImageRendition, Recipe
+
+MAX_ATTEMPTS = 3
+STALE_AFTER = timedelta(minutes=10)
+
+logger = logging.getLogger(__name__)
+executor = ThreadPoolExecutor(
+    max_workers=settings.IMAGE_RENDITION_THREADS,
+    thread_name_prefix="renditions",
+)
+sweeper_lock = Lock()
+sweeper = None
+
+
+def set_status(image_name, status, **fields):
+    ImageRendition.objects.filter(image=image_name).update(
+        status=status, updated_at=timezone.now(), **fields)
+
+
+def process(image_name):
+    claimed = ImageRendition.objects.filter(
+        image=image_name, status=ImageRendition.PENDING
+    ).update(
+        status=ImageRendition.PROCESSING,
+        attempts=F("attempts") + 1,
+        updated_at=timezone.now(),
+    )
+    if not claimed:
+        return False
+    try:
+        width = create_renditions(image_name)
+    except Exception:
+        logger.exception("Не удалось создать версии %s", image_name)
+        attempts = ImageRendition.objects.filter(
+            image=image_name).values_list("attempts", flat=True).first()
+        set_status(
+            image_name,
+            ImageRendition.FAILED if (attempts or 0) >= MAX_ATTEMPTS
+            else ImageRendition.PENDING,
+        )
+        return False
+    set_status(image_name, ImageRendition.DONE, width=width)
+    return True
+
+
+def process_in_thread(image_name):
+    close_old_connections()
+    try:
+        process(image_name)
+    finally:
+        close_old_connections()
+
+
+def requeue_stale():
+    return ImageRendition.objects.filter(
+        status=ImageRendition.PROCESSING,
+        updated_at__lt=timezone.now() - STALE_AFTER,
+    ).update(status=ImageRendition.PENDING, updated_at=timezone.now())
+
+
+def process_pending(limit=None):
+    requeue_stale()
+    images = ImageRendition.objects.filter(
+        status=ImageRendition.PENDING
+    ).order_by("updated_at").values_list("image", flat=True)
+    return sum(process(image_name) for image_name in list(images[:limit]))
+
+
+def sweep():
+    requeue_stale()
+    images = ImageRendition.objects.filter(
+        status=ImageRendition.PENDING,
+        updated_at__lt=timezone.now() - timedelta(
+            seconds=settings.IMAGE_RENDITION_SWEEP_INTERVAL),
+    ).order_by("updated_at").values_list("image", flat=True)
+    for image_name in list(images):
+        executor.submit(process_in_thread, image_name)
+
+
+def run_sweeper():
+    while True:
+        time.sleep(settings.IMAGE_RENDITION_SWEEP_INTERVAL)
+        close_old_connections()
+        try:
+            sweep()
+        except Exception:
+            logger.exception("Не удалось обойти очередь изображений")
+        finally:
+            close_old_connections()
+
+
+def start_sweeper():
+    global sweeper
+    if settings.IMAGE_RENDITION_WORKER != "thread":
+        return
+    with sweeper_lock:
+        if sweeper is None:
+            sweeper = Thread(
+                target=run_sweeper, name="renditions-sweeper", daemon=True)
+            sweeper.start()
+
+
+def enqueue(image_name):
+    rendition, created = ImageRendition.objects.get_or_create(
+        image=image_name)
+    if rendition.status == ImageRendition.DONE:
+        return
+    if rendition.status == ImageRendition.FAILED:
+        rendition.status = ImageRendition.PENDING
+        rendition.attempts = 0
+        rendition.save(update_fields=("status", "attempts", "updated_at"))
+    if settings.IMAGE_RENDITION_WORKER == "thread":
+        transaction.on_commit(
+            lambda: executor.submit(process_in_thread, image_name))
+
+
+def enqueue_missing():
+    images = set(
+        Recipe.objects.exclude(image="").values_list("image", flat=True)
+    ) - set(ImageRendition.objects.values_list("image", flat=True))
+    ImageRendition.objects.bulk_create(
+        [ImageRendition(image=image_name) for image_name in images],
+        ignore_conflicts=True,
+    )
+    return len(images)
+
+
+def cleanup(image_name):
+    if not image_name or Recipe.objects.filter(image=image_name).exists():
+        return
+    ImageRendition.objects.filter(image=image_name).delete()
+    transaction.on_commit(lambda: delete_renditions(image_name))
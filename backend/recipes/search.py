@@ -0,0 +1,125 @@
+import re
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+SEARCH_TABLE = "recipes_recipe_search"
+SEARCH_CONFIG = "russian"
+CHUNK_SIZE = 500
+MAX_TERMS = 8
+
+INGREDIENT_NAMES_SQL = {
+    "postgresql": (
+        "SELECT string_agg(i.name, ' ') FROM recipes_amountingredient a "
+        "JOIN recipes_ingredient i ON i.id = a.ingredient_id "
+        "WHERE a.recipe_id = r.id"
+    ),
+    "sqlite": (
+        "SELECT group_concat(i.name, ' ') FROM recipes_amountingredient a "
+        "JOIN recipes_ingredient i ON i.id = a.ingredient_id "
+        "WHERE a.recipe_id = r.id"
+    ),
+}
+INDEX_SQL = {
+    "postgresql": (
+        f"INSERT INTO {SEARCH_TABLE} (recipe_id, document) "
+        f"SELECT r.id, "
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', r.name), 'A') || "
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', "
+        f"coalesce(({INGREDIENT_NAMES_SQL['postgresql']}), '')), 'B') || "
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', r.text), 'C') "
+        f"FROM recipes_recipe r WHERE {{where}} "
+        f"ON CONFLICT (recipe_id) DO UPDATE SET document = EXCLUDED.document"
+    ),
+    "sqlite": (
+        f"INSERT INTO {SEARCH_TABLE} (rowid, name, ingredients, text) "
+        f"SELECT r.id, r.name, "
+        f"coalesce(({INGREDIENT_NAMES_SQL['sqlite']}), ''), r.text "
+        f"FROM recipes_recipe r WHERE {{where}}"
+    ),
+}
+DELETE_SQL = f"DELETE FROM {SEARCH_TABLE} WHERE {{where}}"
+ID_COLUMN = {
+    "postgresql": "recipe_id",
+    "sqlite": "rowid",
+}
+MATCH_SQL = {
+    "postgresql": (
+        f"SELECT recipe_id FROM {SEARCH_TABLE} "
+        f"WHERE document @@ to_tsquery('{SEARCH_CONFIG}', %s)"
+    ),
+    "sqlite": (
+        f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s"
+    ),
+}
+RANK_SQL = {
+    "postgresql": (
+        f"SELECT ts_rank(document, to_tsquery('{SEARCH_CONFIG}', %s)) "
+        f"FROM {SEARCH_TABLE} WHERE recipe_id = recipes_recipe.id"
+    ),
+    "sqlite": (
+        f"SELECT -bm25({SEARCH_TABLE}, 10.0, 5.0, 1.0) FROM {SEARCH_TABLE} "
+        f"WHERE {SEARCH_TABLE} MATCH %s AND rowid = recipes_recipe.id"
+    ),
+}
+
+
+def is_supported():
+    return connection.vendor in INDEX_SQL
+
+
+def get_terms(query):
+    return re.findall(r"\w+", query.lower())[:MAX_TERMS]
+
+
+def build_query(terms):
+    if connection.vendor == "postgresql":
+        return " & ".join(f"{term}:*" for term in terms)
+    return " AND ".join(f'"{term}"*' for term in terms)
+
+
+def execute(sql, column, ids=None):
+    with connection.cursor() as cursor:
+        if ids is None:
+            cursor.execute(sql.format(where="1 = 1"))
+            return
+        ids = list(ids)
+        for start in range(0, len(ids), CHUNK_SIZE):
+            chunk = ids[start:start + CHUNK_SIZE]
+            placeholders = ", ".join(["%s"] * len(chunk))
+            cursor.execute(
+                sql.format(where=f"{column} IN ({placeholders})"), chunk)
+
+
+def delete_recipes(ids=None):
+    if is_supported():
+        execute(DELETE_SQL, ID_COLUMN[connection.vendor], ids)
+
+
+def index_recipes(ids=None):
+    if not is_supported():
+        return
+    if connection.vendor == "sqlite":
+        delete_recipes(ids)
+    execute(INDEX_SQL[connection.vendor], "r.id", ids)
+
+
+def rebuild():
+    delete_recipes()
+    index_recipes()
+
+
+def search(queryset, query):
+    terms = get_terms(query)
+    if not terms:
+        return queryset.none()
+    if not is_supported():
+        for term in terms:
+            queryset = queryset.filter(name__icontains=term)
+        return queryset
+    match = build_query(terms)
+    return queryset.filter(
+        id__in=RawSQL(MATCH_SQL[connection.vendor], (match,))
+    ).annotate(
+        search_rank=RawSQL(RANK_SQL[connection.vendor], (match,))
+    ).order_by("-search_rank", "-pub_date", "-id")
@@ -25,13 +25,15 @@ class UserAdmin(UserAdmin):
 
     save_on_top = True
 
-    @admin.display(description="Количество рецептов")
+    @admin.display(description="Количество рецептов",
+                   ordering="recipes_count")
     def get_recipes_count(self, obj):
-        return obj.recipes.count()
+        return obj.recipes_count
 
-    @admin.display(description="Количество подписчиков")
+    @admin.display(description="Количество подписчиков",
+                   ordering="subscribers_count")
     def get_subscribers_count(self, obj):
-        return obj.author.count()
+        return obj.subscribers_count
 
 
 @admin.register(Subscription)
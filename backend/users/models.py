@@ -45,6 +45,16 @@ class User(AbstractUser):
                          "нижнее тире.")
             )]
     )
+    recipes_count = models.PositiveIntegerField(
+        verbose_name="Количество рецептов",
+        default=0,
+        editable=False,
+    )
+    subscribers_count = models.PositiveIntegerField(
+        verbose_name="Количество подписчиков",
+        default=0,
+        editable=False,
+    )
 
     class Meta:
         verbose_name = "Пользователь"
@@ -67,11 +77,18 @@ class Subscription(models.Model):
         related_name="author",
         on_delete=models.CASCADE,
         verbose_name="Автор",
+        db_index=False,
     )
 
     class Meta:
         verbose_name = "Подписка"
         verbose_name_plural = "Подписки"
+        indexes = (
+            models.Index(
+                fields=("author", "user"),
+                name="subscription_author_user_idx",
+            ),
+        )
         constraints = (
             models.UniqueConstraint(
                 fields=("user", "author"),